@@ -1,31 +1,39 @@
 from typing import Annotated
 
 from fastapi import Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 
 from auth.authorizers import require_authentication
-from auth.authorization import generate_user_access_token, get_is_authenticated
+from auth.authorization import generate_user_access_token, get_is_authenticated, get_user
 from auth.models import User
-from auth.password import hash_password, verify_password
+from auth.password import hash_password_async, verify_and_update_password_async
 from auth.schemas import CreateUserForm, LoginForm, LoginUserResponse, PublicUser
 from db import SessionDep
 from utils.base_view import BaseApi
 from utils.exceptions import ValidationError
 from utils.response import JsonResponse
 
+UNIQUE_VIOLATION = '23505'
 
-def registration_api(
+
+async def registration_api(
     user_data: CreateUserForm,
     is_authenticated: Annotated[bool, Depends(get_is_authenticated)],
     db_session: SessionDep,
 ):
     if is_authenticated:
         raise HTTPException(403, 'User is already authenticated')
-    user_data.password = hash_password(user_data.password)
+    user_data.password = await hash_password_async(user_data.password)
     user = User.model_validate(user_data)
     db_session.add(user)
-    db_session.commit()
-    db_session.refresh(user)
+    try:
+        await db_session.commit()
+    except IntegrityError as error:
+        # email is the only unique column
+        if getattr(error.orig, 'pgcode', None) != UNIQUE_VIOLATION:
+            raise
+        raise ValidationError({'email': ['Email is already in use.']})
     return JsonResponse(
         content=LoginUserResponse(
             user=PublicUser.model_validate(user),
@@ -35,7 +43,7 @@ def registration_api(
     )
 
 
-def login_api(
+async def login_api(
     login_form: LoginForm,
     is_authenticated: Annotated[bool, Depends(get_is_authenticated)],
     db_session: SessionDep,
@@ -43,12 +51,17 @@ def login_api(
     if is_authenticated:
         raise HTTPException(403, 'User is already logged in')
     query = select(User).where(User.email == login_form.email)
-    user = db_session.exec(query).first()
+    user = (await db_session.exec(query)).first()
     if not user:
         raise ValidationError({'__all__': ['Incorrect email or password']})
-    is_valid = verify_password(login_form.password, user.password)
+    is_valid, new_hash = await verify_and_update_password_async(login_form.password, user.password)
     if not is_valid:
         raise ValidationError({'__all__': ['Incorrect email or password']})
+    if new_hash is not None:
+        # hashing cost was raised since the password was set
+        user.password = new_hash
+        db_session.add(user)
+        await db_session.commit()
     return LoginUserResponse(
         user=PublicUser.model_validate(user),
         access_token=generate_user_access_token(user),
@@ -67,9 +80,10 @@ class CurrentUserApi(BaseApi):
 
 class UserApi(BaseApi):
     authorizers = [require_authentication]
+    read_only = True
 
     async def get(self, request, user_id):
-        user = self.db_session.get(User, user_id)
+        user = await self.db_session.get(User, user_id)
         if not user:
             raise HTTPException(status_code=404, detail='User not found')
         return PublicUser.model_validate(user)
@@ -82,4 +96,8 @@ class AccessTokenApi(BaseApi):
         return request.access_token
 
     async def post(self, request):
-        return generate_user_access_token(request.user)
+        # the user may come from the token claims, the new token gets the current ones
+        user = await get_user(request.user.id)
+        if user is None or not user.is_active:
+            raise HTTPException(401, 'User is not authenticated')
+        return generate_user_access_token(user)
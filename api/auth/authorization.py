@@ -1,24 +1,162 @@
+import asyncio
+import json
+import logging
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
 import jwt
 from fastapi import HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
 
 from auth.schemas import AccessToken
 from auth.password import verify_password
 from auth.models import User
 from conf import settings
-from db import get_session
+from db import get_async_session
+from utils.broadcast import get_broadcast
+from utils.cache import TTLCache
 
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='token', auto_error=False)
 
+# enough to authenticate without a user lookup, see auth_trust_token_claims
+USER_CLAIMS = ('sub', 'name', 'is_active', 'is_superuser', 'updated_at')
+
 
 class CredentialValidationException(Exception):
     pass
 
 
+class UserCache:
+    """authenticated users by id, saves a query on every authenticated request.
+    entries are dropped whenever the user row is updated, other processes are notified through
+    the broadcast once the change is committed. nothing is cached unless the broadcast reaches every
+    app process, the others would keep changed users until the ttl passes.
+    """
+    channel = 'auth_users'
+
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._listener_task = None
+        # holds invalidations scheduled from commits until they are published
+        self._publish_tasks = set()
+
+    @property
+    def is_enabled(self) -> bool:
+        return get_broadcast().reaches_all_processes
+
+    def get(self, user_id: int) -> User | None:
+        if not self.is_enabled:
+            return None
+        return self._cache.get(user_id)
+
+    def set(self, user: User):
+        if self.is_enabled:
+            self._cache.set(user.id, user)
+
+    def delete(self, user_id: int):
+        self._cache.delete(user_id)
+
+    def clear(self):
+        self._cache.clear()
+
+    async def invalidate(self, user_ids: list[int]):
+        for user_id in user_ids:
+            self.delete(user_id)
+        broadcast = get_broadcast()
+        if user_ids and broadcast.is_connected:
+            try:
+                await broadcast.publish(self.channel, json.dumps(user_ids))
+            except Exception:
+                logger.exception('Failed to publish user invalidation.')
+
+    def invalidate_later(self, user_ids: list[int]):
+        """for commits of sync code, publishes from the running event loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # committed outside of the app, e.g. by a script
+            return
+        task = loop.create_task(self.invalidate(user_ids))
+        self._publish_tasks.add(task)
+        task.add_done_callback(self._publish_tasks.discard)
+
+    async def _listen(self):
+        async with get_broadcast().subscribe(self.channel) as subscriber:
+            async for event in subscriber:
+                for user_id in json.loads(event.message):
+                    self.delete(user_id)
+
+    async def start(self):
+        self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            self._listener_task = None
+
+
+@lru_cache
+def get_user_cache() -> UserCache:
+    return UserCache(
+        max_size=settings.auth_user_cache_max_size,
+        ttl=settings.auth_user_cache_ttl_seconds,
+    )
+
+
+def invalidate_user(session: Session | None, user_id: int):
+    get_user_cache().delete(user_id)
+    if session is not None:
+        session.info.setdefault('invalidated_user_ids', set()).add(user_id)
+
+
+@event.listens_for(User, 'after_update')
+def invalidate_updated_user(mapper, connection, target: User):
+    # also fires for users that only had related collections changed
+    state = inspect(target)
+    if any(state.attrs[attr.key].history.has_changes() for attr in mapper.column_attrs):
+        invalidate_user(state.session, target.id)
+
+
+@event.listens_for(User, 'after_delete')
+def invalidate_deleted_user(mapper, connection, target: User):
+    invalidate_user(inspect(target).session, target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_invalidated_users(session: Session):
+    user_ids = session.info.pop('invalidated_user_ids', None)
+    if user_ids:
+        get_user_cache().invalidate_later(sorted(user_ids))
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_invalidated_users(session: Session):
+    session.info.pop('invalidated_user_ids', None)
+
+
+async def get_user(user_id: int, updated_at: float | None = None) -> User | None:
+    """`updated_at` of the token claims, a cached user older than the token is looked up again.
+    """
+    user_cache = get_user_cache()
+    user = user_cache.get(user_id)
+    if user is not None and (
+        updated_at is None
+        or (user.updated_at is not None and user.updated_at.timestamp() >= updated_at)
+    ):
+        return user
+    async with get_async_session() as db_session:
+        user = await db_session.get(User, user_id)
+    if user is not None:
+        user_cache.set(user)
+    return user
+
+
 def authenticate_user(email: str, password: str):
     user = User(email=email)
     if not user:
@@ -58,7 +196,9 @@ def decode_token(token: str):
     return payload
 
 
-async def authenticate_token(token: str):
+def validate_token(token: str) -> dict:
+    """decodes the token and checks its expiry, returns the claims.
+    """
     try:
         payload = decode_token(token)
         expires_at = payload.get('expires_at')
@@ -69,10 +209,33 @@ async def authenticate_token(token: str):
         user_id = payload.get('sub')
         if user_id is None:
             raise CredentialValidationException('Could not validate credentials')
-    except InvalidTokenError:
+        int(user_id)
+    except (InvalidTokenError, ValueError):
         raise CredentialValidationException('Could not validate credentials')
-    with get_session() as db_session:
-        user = db_session.get(User, user_id)
+    return payload
+
+
+def get_user_from_claims(claims: dict) -> User | None:
+    """user as of the token issue, for tokens carrying the user claims.
+    """
+    if not all(key in claims for key in USER_CLAIMS):
+        return None
+    return User(
+        id=int(claims['sub']),
+        name=claims['name'],
+        is_active=claims['is_active'],
+        is_superuser=claims['is_superuser'],
+        updated_at=datetime.fromtimestamp(claims['updated_at'], timezone.utc),
+    )
+
+
+async def authenticate_claims(claims: dict):
+    user = None
+    if settings.auth_trust_token_claims:
+        # changes to the user are only seen once the token is refreshed
+        user = get_user_from_claims(claims)
+    if user is None:
+        user = await get_user(int(claims['sub']), claims.get('updated_at'))
     if user is None:
         raise CredentialValidationException('Could not validate credentials')
     if not user.is_active:
@@ -80,12 +243,22 @@ async def authenticate_token(token: str):
     return user
 
 
+async def authenticate_token(token: str):
+    return await authenticate_claims(validate_token(token))
+
+
 def generate_user_access_token(user: User) -> AccessToken:
     if not isinstance(user, User):
         raise TypeError('Invalid value of user')
-    access_token = create_access_token(
-        data={'sub': str(user.id)},
-    )
+    data = {
+        'sub': str(user.id),
+        'name': user.name,
+        'is_active': user.is_active,
+        'is_superuser': user.is_superuser,
+    }
+    if user.updated_at is not None:
+        data['updated_at'] = user.updated_at.timestamp()
+    access_token = create_access_token(data=data)
     return access_token
 
 
@@ -1,4 +1,4 @@
-from utils.request import Request
+from starlette.requests import HTTPConnection
 from starlette.types import ASGIApp, Receive, Scope, Send
 
 
@@ -7,13 +7,30 @@ class SessionUserMiddleware:
         self.app = app
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send):
-        from auth.authorization import oauth2_scheme, authenticate_token, CredentialValidationException
-        request = Request(scope, receive=receive, send=send)
-        token = await oauth2_scheme(request)
-        try:
-            authenticated_user = await authenticate_token(token)
-        except CredentialValidationException:
-            authenticated_user = None
+        from auth.authorization import (
+            CredentialValidationException,
+            authenticate_claims,
+            oauth2_scheme,
+            validate_token,
+        )
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+        connection = HTTPConnection(scope, receive=receive)
+        token = await oauth2_scheme(connection)
+        if not token and scope['type'] == 'websocket':
+            # browsers can't set headers on websocket handshake
+            token = connection.query_params.get('token')
+        authenticated_user = None
+        token_claims = None
+        if token:
+            try:
+                token_claims = validate_token(token)
+                authenticated_user = await authenticate_claims(token_claims)
+            except CredentialValidationException:
+                pass
         scope['user'] = authenticated_user
         scope['token'] = token
-        await self.app(scope, receive, send)
\ No newline at end of file
+        # decoded once per connection, reused by Request.access_token
+        scope['token_claims'] = token_claims
+        await self.app(scope, receive, send)
@@ -22,17 +22,33 @@ class User(TimestampsMixin, SQLModel, table=True):
     roles: List['RoomRole'] = Relationship(
         back_populates='user',
         cascade_delete=True,
+        passive_deletes=True,
     )
 
     def __eq__(self, other):
+        if not isinstance(other, User):
+            return NotImplemented
         return (self.id == other.id) and (self.updated_at == other.updated_at)
 
     def set_password(self, password):
-        from auth.password import hash_password
+        from auth.password import get_password_executor, hash_password
         from db import get_session
 
+        # blocks the caller either way, the password pool keeps the default threadpool free
+        password = get_password_executor().submit(hash_password, password).result()
         with get_session() as db_session:
             local_object = db_session.merge(self)
-            local_object.password = hash_password(password)
+            local_object.password = password
             db_session.add(local_object)
             db_session.commit()
+
+    async def set_password_async(self, password):
+        from auth.password import hash_password_async
+        from db import get_async_session
+
+        password = await hash_password_async(password)
+        async with get_async_session() as db_session:
+            local_object = await db_session.merge(self)
+            local_object.password = password
+            db_session.add(local_object)
+            await db_session.commit()
@@ -1,12 +1,56 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 from passlib.context import CryptContext
 
+from conf import settings
+
+
+@lru_cache
+def get_password_context() -> CryptContext:
+    # hashes made with fewer rounds are reported by needs_update and rehashed on login
+    return CryptContext(
+        schemes=['bcrypt'],
+        deprecated='auto',
+        bcrypt__default_rounds=settings.auth_password_hash_rounds,
+        bcrypt__min_rounds=settings.auth_password_hash_rounds,
+    )
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+
+@lru_cache
+def get_password_executor() -> ThreadPoolExecutor:
+    """dedicated pool for password hashing, so a burst of logins can't starve the default threadpool.
+    bcrypt releases the GIL while hashing, threads run in parallel.
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.auth_password_hash_workers,
+        thread_name_prefix='password-hash',
+    )
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_password_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password, hashed_password) -> tuple[bool, str | None]:
+    """returns whether the password is valid and a new hash, if the stored one is outdated.
+    """
+    return get_password_context().verify_and_update(plain_password, hashed_password)
 
 
 def hash_password(password):
-    return pwd_context.hash(password)
+    return get_password_context().hash(password)
+
+
+async def run_in_password_executor(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), func, *args)
+
+
+async def hash_password_async(password):
+    return await run_in_password_executor(hash_password, password)
+
+
+async def verify_and_update_password_async(plain_password, hashed_password) -> tuple[bool, str | None]:
+    return await run_in_password_executor(verify_and_update_password, plain_password, hashed_password)
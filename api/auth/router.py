@@ -15,4 +15,4 @@ auth_router.add_api_route('/registration', registration_api, methods=['POST'], n
 auth_router.add_api_route('/login', login_api, methods=['POST'], name='auth:login_api')
 auth_router.add_api_route('/token', AccessTokenApi.as_view(), methods=['GET', 'POST'], name='auth:access_token_api')
 auth_router.add_api_route('/me', CurrentUserApi.as_view(), methods=['GET', 'PUT', 'PATCH'], name='auth:current_user_api')
-auth_router.add_api_route('/user/{user_id}', UserApi.as_view(), methods=['GET'], name='auth:get_user')
\ No newline at end of file
+auth_router.add_api_route('/user/{user_id:int}', UserApi.as_view(), methods=['GET'], name='auth:get_user')
\ No newline at end of file
@@ -1,9 +1,5 @@
 from typing import Optional
-from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
-from sqlmodel import select
-
-from auth.models import User
-from db import get_session
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
 
 class AccessToken(BaseModel):
@@ -17,16 +13,6 @@ class CreateUserForm(BaseModel):
     name: Optional[str]
     password: str = Field(min_length=6)
 
-    @field_validator('email')
-    @classmethod
-    def validate_email(cls, value):
-        with get_session() as db_session:
-            query = select(User).where(User.email == value)
-            existing_user = db_session.exec(query).first()
-            if existing_user:
-                raise ValueError('Email is already in use.')
-        return value
-
 
 class PublicUser(BaseModel):
     model_config = ConfigDict(from_attributes=True)
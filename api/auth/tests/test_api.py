@@ -4,7 +4,7 @@ from sqlmodel import select
 
 from auth.authorization import generate_user_access_token
 from auth.models import User
-from auth.password import verify_password
+from auth.password import get_password_context, verify_password
 from auth.tests.factories import UserFactory
 from db import get_session
 from utils.test_matchers import StringContaining
@@ -224,6 +224,26 @@ class LoginViewTestCase(ApiTestCase):
                 'expires_at': ANY,
             })
 
+    def test_rehash(self):
+        password = 'correct_password_123'
+        password_context = get_password_context()
+        outdated_hash = password_context.handler().using(rounds=4).hash(password)
+        with get_session() as db_session:
+            user = db_session.merge(self.user)
+            user.password = outdated_hash
+            db_session.commit()
+        with self.subTest('should rehash outdated password on login'):
+            response = self.client.post(self.url, json={
+                'email': self.user.email,
+                'password': password,
+            })
+            self.assertEqual(response.status_code, 200)
+            with get_session() as db_session:
+                user = db_session.get(User, self.user.id)
+            self.assertNotEqual(user.password, outdated_hash)
+            self.assertFalse(password_context.needs_update(user.password))
+            self.assertTrue(verify_password(password, user.password))
+
 
 class AccessTokenApiTestCase(ApiTestCase):
     @property
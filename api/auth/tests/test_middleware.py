@@ -1,12 +1,18 @@
+import asyncio
 from unittest import IsolatedAsyncioTestCase
 
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from freezegun import freeze_time
+from sqlalchemy import text
 
-from auth.authorization import generate_user_access_token
+from auth.authorization import UserCache, create_access_token, generate_user_access_token, get_user_cache
 from auth.tests.factories import UserFactory
 from auth.middleware import SessionUserMiddleware
+from auth.models import User
+from auth.password import verify_password
+from db import get_async_session, get_session
+from utils.base_tests import ApiTestCase, override_settings, shared_broadcast
 from utils.request import Request
 
 
@@ -66,3 +72,109 @@ class SessionMiddlewareTestCase(IsolatedAsyncioTestCase):
             response = await self.request(token=token.token)
             response_user_id = response.json()
             self.assertIsNone(response_user_id)
+
+    @shared_broadcast()
+    async def test_user_cache(self):
+        user_cache = get_user_cache()
+        with self.subTest('should cache authenticated user'):
+            self.assertIsNone(user_cache.get(self.user.id))
+            response = await self.request(self.user)
+            self.assertEqual(response.json(), self.user.id)
+            self.assertEqual(user_cache.get(self.user.id), self.user)
+        with self.subTest('should invalidate cached user on password change'):
+            self.user.set_password('somebody_once_told_me')
+            self.assertIsNone(user_cache.get(self.user.id))
+        await self.request(self.user)
+        with self.subTest('should invalidate cached user on async password change'):
+            self.assertIsNotNone(user_cache.get(self.user.id))
+            await self.user.set_password_async('the_world_is_gonna_roll_me')
+            self.assertIsNone(user_cache.get(self.user.id))
+            with get_session() as db_session:
+                password = db_session.get(User, self.user.id).password
+            self.assertTrue(verify_password('the_world_is_gonna_roll_me', password))
+        await self.request(self.user)
+        with self.subTest('should not authenticate user deactivated after caching'):
+            with get_session() as db_session:
+                user = db_session.merge(self.user)
+                user.is_active = False
+                db_session.add(user)
+                db_session.commit()
+            self.assertIsNone(user_cache.get(self.user.id))
+            response = await self.request(self.user)
+            self.assertIsNone(response.json())
+        with self.subTest('should look up cached user older than the token'):
+            user = UserFactory()
+            await self.request(user)
+            # changed by another process
+            with get_session() as db_session:
+                db_session.execute(
+                    text("UPDATE auth_users SET name = 'renamed', updated_at = now() WHERE id = :id"),
+                    {'id': user.id},
+                )
+                db_session.commit()
+                changed_user = db_session.get(User, user.id)
+                db_session.refresh(changed_user)
+            self.assertNotEqual(user_cache.get(user.id).name, 'renamed')
+            response = await self.request(changed_user)
+            self.assertEqual(response.json(), user.id)
+            self.assertEqual(user_cache.get(user.id).name, 'renamed')
+
+    @shared_broadcast()
+    @override_settings(auth_trust_token_claims=True)
+    def test_trusted_claims(self):
+        user_cache = get_user_cache()
+
+        def get_user_id(token):
+            return self.client.get('/', headers={'Authorization': f'Bearer {token}'}).json()
+
+        with self.subTest('should authenticate by token claims without user lookup'):
+            token = generate_user_access_token(self.user)
+            self.assertEqual(get_user_id(token.token), self.user.id)
+            self.assertIsNone(user_cache.get(self.user.id))
+        with self.subTest('should not authenticate inactive user claims'):
+            user = UserFactory.build(is_active=False)
+            user.id = self.user.id
+            user.updated_at = self.user.updated_at
+            token = generate_user_access_token(user)
+            self.assertIsNone(get_user_id(token.token))
+        with self.subTest('should look the user up if token has no user claims'):
+            token = create_access_token({'sub': str(self.user.id)})
+            self.assertEqual(get_user_id(token.token), self.user.id)
+            self.assertEqual(user_cache.get(self.user.id), self.user)
+
+
+class UserCacheTestCase(ApiTestCase):
+    @shared_broadcast()
+    def test_shared_invalidation(self):
+        portal = self.client.portal
+        # a cache of another process, listening to the same broadcast
+        other_cache = UserCache(max_size=10, ttl=60)
+        portal.call(other_cache.start)
+        self.addCleanup(portal.call, other_cache.stop)
+        portal.call(asyncio.sleep, 0.01)
+        other_cache.set(self.user)
+
+        async def rename_user():
+            async with get_async_session() as db_session:
+                user = await db_session.get(User, self.user.id)
+                user.name = 'renamed'
+                db_session.add(user)
+                await db_session.commit()
+
+        with self.subTest('should invalidate committed user changes in other processes'):
+            portal.call(rename_user)
+            portal.call(asyncio.sleep, 0.01)
+            self.assertIsNone(other_cache.get(self.user.id))
+
+    def test_memory_broadcast(self):
+        user_cache = get_user_cache()
+        with self.subTest('should cache users with the memory broadcast in a single process'):
+            user_cache.set(self.user)
+            self.assertEqual(user_cache.get(self.user.id), self.user)
+
+    @override_settings(app_processes=2)
+    def test_memory_broadcast_processes(self):
+        user_cache = get_user_cache()
+        with self.subTest('should not cache users the memory broadcast can not invalidate in other processes'):
+            user_cache.set(self.user)
+            self.assertIsNone(user_cache.get(self.user.id))
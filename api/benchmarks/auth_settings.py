@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""compares token generation and validation with settings resolved on every access and with cached settings.
+doesn't need a database.
+
+    python -m benchmarks.auth_settings --number 10000
+"""
+import argparse
+
+from benchmarks.utils import time_callable
+
+
+class ResolvingSettings:
+    """previous proxy behaviour, resolves the settings object on every attribute access.
+    """
+
+    def __getattribute__(self, name):
+        from conf import get_settings
+
+        return getattr(get_settings(), name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    import auth.authorization
+    from auth.authorization import generate_user_access_token, validate_token
+    from auth.models import User
+    from chat.models import RoomRole  # noqa: F401, configures User relationships
+    from conf import settings
+
+    user = User(id=1, name='benchmark', is_active=True, is_superuser=False)
+    token = generate_user_access_token(user).token
+    cases = {
+        'generate': lambda: generate_user_access_token(user),
+        'validate': lambda: validate_token(token),
+    }
+    results = {}
+    for name, func in cases.items():
+        auth.authorization.settings = ResolvingSettings()
+        before = time_callable(func, repeat=args.repeat, number=args.number)
+        auth.authorization.settings = settings
+        after = time_callable(func, repeat=args.repeat, number=args.number)
+        results[name] = (before, after)
+
+    print(f'{"operation":<12}{"resolving, us":>16}{"cached, us":>16}')
+    for name, (before, after) in results.items():
+        print(f'{name:<12}{before * 1000 / args.number:>16.2f}{after * 1000 / args.number:>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""compares room timeline queries with and without the (chat_room_id, created_at, id) index.
+
+    DB_USER=postgres DB_PASSWORD=postgres python -m benchmarks.message_timeline --messages 2000000
+"""
+import argparse
+
+from sqlalchemy import desc, func, select, text, tuple_
+
+from benchmarks.utils import analyze, benchmark_database, explain, time_statement
+
+INDEX_NAME = 'ix_message_chat_room_id_created_at_id'
+
+
+def seed(connection, messages, other_messages, rooms):
+    connection.execute(text("""
+        INSERT INTO auth_users (email, name, password, is_active, is_superuser)
+        VALUES ('benchmark@example.com', 'benchmark', '', true, false)
+    """))
+    connection.execute(text(
+        "INSERT INTO chat_room (name) SELECT 'room ' || i FROM generate_series(1, :rooms) AS i"
+    ), {'rooms': rooms})
+    # the measured room gets `messages`, the rest are spread over the other rooms
+    connection.execute(text("""
+        INSERT INTO message (chat_room_id, created_by_id, content, type, created_at, updated_at)
+        SELECT
+            CASE WHEN i <= :messages THEN 1 ELSE 2 + i % (:rooms - 1) END,
+            1,
+            md5(i::text),
+            'TEXT',
+            now() - (i * interval '1 second'),
+            now() - (i * interval '1 second')
+        FROM generate_series(1, :total) AS i
+    """), {'messages': messages, 'rooms': rooms, 'total': messages + other_messages})
+
+
+def get_statements(connection, page_size, deep_page):
+    from chat.models import Message
+
+    timeline = (
+        select(Message)
+        .where(Message.chat_room_id == 1)
+        .order_by(desc(Message.created_at), desc(Message.id))
+    )
+    offset = (deep_page - 1) * page_size
+    # keyset equivalent of the deep page, the cursor points right before it
+    cursor = connection.execute(
+        select(Message.created_at, Message.id)
+        .where(Message.chat_room_id == 1)
+        .order_by(desc(Message.created_at), desc(Message.id))
+        .offset(offset - 1)
+        .limit(1)
+    ).one()
+    return {
+        'first page': timeline.limit(page_size),
+        f'page {deep_page} (offset)': timeline.offset(offset).limit(page_size),
+        f'page {deep_page} (keyset)': (
+            timeline
+            .where(tuple_(Message.created_at, Message.id) < tuple(cursor))
+            .limit(page_size + 1)
+        ),
+        'count': select(func.count()).select_from(
+            select(Message.id).where(Message.chat_room_id == 1).subquery()
+        ),
+    }
+
+
+def measure(connection, statements, verbose):
+    timings = {}
+    for name, statement in statements.items():
+        plan = explain(connection, statement)
+        if verbose:
+            print(f'--- {name}\n{plan}\n')
+        timings[name] = time_statement(connection, statement)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2_000_000, help='messages in the measured room')
+    parser.add_argument('--other-messages', type=int, default=1_000_000, help='messages in the rest of the rooms')
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--page-size', type=int, default=25)
+    parser.add_argument('--deep-page', type=int, default=1000)
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark database')
+    parser.add_argument('--verbose', action='store_true', help='print query plans')
+    args = parser.parse_args()
+    deep_page = min(args.deep_page, max(args.messages // args.page_size, 2))
+
+    with benchmark_database(keep=args.keep) as engine, engine.begin() as connection:
+        seed(connection, args.messages, args.other_messages, args.rooms)
+        statements = get_statements(connection, args.page_size, deep_page)
+
+        connection.execute(text(f'DROP INDEX {INDEX_NAME}'))
+        analyze(connection, 'message')
+        without_index = measure(connection, statements, args.verbose)
+
+        connection.execute(text(
+            f'CREATE INDEX {INDEX_NAME} ON message (chat_room_id, created_at DESC, id DESC)'
+        ))
+        analyze(connection, 'message')
+        with_index = measure(connection, statements, args.verbose)
+
+    print(f'{"query":<24}{"no index, ms":>16}{"index, ms":>16}')
+    for name in statements:
+        print(f'{name:<24}{without_index[name]:>16.2f}{with_index[name]:>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""compares serialization of a messages page through FastAPI response model and stdlib json
+with a single pydantic pass straight from ORM objects. doesn't need a database.
+
+    python -m benchmarks.serialization --page-size 100
+"""
+import argparse
+import asyncio
+import datetime
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from benchmarks.utils import time_callable
+
+
+def get_page(page_size):
+    from auth.models import User  # noqa: F401, configures RoomRole relationships
+    from chat.models import Message, MessageTypeEnum
+
+    created_at = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    messages = [
+        Message(
+            id=i,
+            content=f'somebody once told me the world is gonna roll me {i}',
+            type=MessageTypeEnum.TEXT,
+            chat_room_id=1,
+            created_by_id=1,
+            created_at=created_at + datetime.timedelta(seconds=i),
+            updated_at=created_at + datetime.timedelta(seconds=i),
+        )
+        for i in range(page_size)
+    ]
+    return {
+        'total': 10000,
+        'page': 1,
+        'page_size': page_size,
+        'next': 2,
+        'results': messages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--number', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    from chat.schemas import MessagesList
+    from utils.response import model_response
+
+    page = get_page(args.page_size)
+    field = create_model_field('response', MessagesList, mode='serialization')
+
+    def fastapi_response():
+        content = asyncio.run(serialize_response(field=field, response_content=page))
+        return JSONResponse(content).body
+
+    def pydantic_response():
+        return model_response(MessagesList, page).body
+
+    # asyncio.run overhead is not part of the comparison
+    run_overhead = time_callable(lambda: asyncio.run(asyncio.sleep(0)), repeat=args.repeat, number=args.number)
+    before = time_callable(fastapi_response, repeat=args.repeat, number=args.number) - run_overhead
+    after = time_callable(pydantic_response, repeat=args.repeat, number=args.number)
+
+    print(f'{"path":<24}{"ms per page":>12}')
+    print(f'{"response model + json":<24}{before / args.number:>12.3f}')
+    print(f'{"pydantic dump_json":<24}{after / args.number:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import NullPool, text
+from sqlalchemy_utils.functions import create_database, database_exists, drop_database
+
+from conf import get_settings, settings
+
+
+def use_benchmark_database():
+    """points settings to a throwaway database, must be called before any engine is created.
+    """
+    benchmark_settings = get_settings()
+    benchmark_settings.db_name = f'benchmark_{settings.db_name}'
+    # every asyncio.run has its own loop, pooled connections can't be shared between them
+    benchmark_settings.db_async_pool_class = NullPool
+    settings.reload()
+
+
+def run_migrations():
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_cfg = Config()
+    alembic_cfg.set_main_option('script_location', str(settings.base_dir / 'migrations'))
+    command.upgrade(alembic_cfg, 'head')
+
+
+@contextmanager
+def benchmark_database(keep=False):
+    from db import get_db_connection_dsn, get_engine
+
+    use_benchmark_database()
+    dsn = get_db_connection_dsn()
+    if database_exists(dsn):
+        drop_database(dsn)
+    create_database(dsn)
+    run_migrations()
+    engine = get_engine()
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        if not keep:
+            drop_database(dsn)
+
+
+def explain(connection, statement):
+    """returns EXPLAIN ANALYZE output of a SQLAlchemy statement.
+    """
+    compiled = statement.compile(connection)
+    result = connection.exec_driver_sql(
+        f'EXPLAIN (ANALYZE, BUFFERS) {compiled}',
+        compiled.params,
+    )
+    return '\n'.join(row[0] for row in result)
+
+
+def time_statement(connection, statement, repeat=20):
+    """median execution time in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        connection.execute(statement).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def time_callable(func, repeat=20, number=1):
+    """median time of `number` calls in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def analyze(connection, table_name):
+    connection.execute(text(f'ANALYZE {table_name}'))
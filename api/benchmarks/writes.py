@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""compares message writes per second with a refresh after commit and with defaults returned by the write itself.
+
+    DB_USER=postgres DB_PASSWORD=postgres python -m benchmarks.writes --writes 2000
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from benchmarks.utils import benchmark_database
+
+
+async def create_messages(writes, refresh):
+    from chat.models import Message
+    from db import get_async_session
+
+    async with get_async_session() as db_session:
+        for i in range(writes):
+            message = Message(chat_room_id=1, created_by_id=1, content=f'message {i}')
+            db_session.add(message)
+            await db_session.commit()
+            if refresh:
+                await db_session.refresh(message)
+
+
+async def update_messages(writes, refresh):
+    from chat.models import Message
+    from db import get_async_session
+
+    async with get_async_session() as db_session:
+        message = await db_session.get(Message, 1)
+        for i in range(writes):
+            message.content = f'edited {i}'
+            db_session.add(message)
+            await db_session.commit()
+            if refresh:
+                await db_session.refresh(message)
+
+
+def writes_per_second(func, writes, refresh):
+    start = time.perf_counter()
+    asyncio.run(func(writes, refresh))
+    return writes / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writes', type=int, default=2000)
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark database')
+    args = parser.parse_args()
+
+    with benchmark_database(keep=args.keep) as engine:
+        from chat.models import Message
+
+        with engine.begin() as connection:
+            connection.execute(text("""
+                INSERT INTO auth_users (email, name, password, is_active, is_superuser)
+                VALUES ('benchmark@example.com', 'benchmark', '', true, false)
+            """))
+            connection.execute(text("INSERT INTO chat_room (name) VALUES ('benchmark')"))
+        results = {}
+        for name, func in (('insert', create_messages), ('update', update_messages)):
+            # previous behaviour, server defaults of updates are fetched by the refresh
+            Message.__mapper__.eager_defaults = 'auto'
+            before = writes_per_second(func, args.writes, refresh=True)
+            Message.__mapper__.eager_defaults = True
+            after = writes_per_second(func, args.writes, refresh=False)
+            results[name] = (before, after)
+
+    print(f'{"write":<12}{"refresh, w/s":>16}{"returning, w/s":>16}')
+    for name, (before, after) in results.items():
+        print(f'{name:<12}{before:>16.0f}{after:>16.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,23 +3,54 @@ import datetime
 from typing import Annotated, List
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import desc, select
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, WebSocket, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, or_, true, tuple_, update
+from sqlalchemy.dialects.postgresql import websearch_to_tsquery
+from sqlalchemy.orm import aliased, selectinload
+from sqlmodel import delete, desc, func, select
 
 from auth.authorization import get_current_user
 from auth.models import User
+from chat.events import (
+    RoomEventTypeEnum,
+    publish_message_deleted,
+    publish_message_event,
+    publish_messages_event,
+    publish_role_deleted,
+    publish_room_deleted,
+    stream_room_events,
+)
+from chat.export import (
+    EXPORT_MEDIA_TYPES,
+    EXPORTERS,
+    ExportFormatEnum,
+    acquire_export_slot,
+    release_export_slot_when_done,
+)
+from chat.membership import RoomMembership, get_membership_cache, get_room_membership
 from chat.models import (
+    MESSAGE_SEARCH_CONFIG,
+    MESSAGE_SUBSTRING_SEARCH_MIN_LENGTH,
     ChatRoom,
     Message,
     MessageTypeEnum,
     RoomInvite,
     RoomRole,
     RoomRoleEnum,
+    message_search_vector,
 )
+from chat.purge import purge_chat_room
+from chat.read_state import get_read_state_buffer
 from chat.schemas import (
+    PUBLIC_MESSAGE_COLUMNS,
+    ChatRoomSummary,
     ChatRoomUpdate,
+    ChatRoomsList,
     CreateMessageBody,
+    CreateMessagesBatchBody,
     CreateRoomBody,
+    MarkReadBody,
     MessageUpdateBody,
     MessagesList,
     PublicChatInvite,
@@ -29,36 +60,128 @@ from chat.schemas import (
     RoomRoleUpdateBody,
 )
 from conf import settings
-from db import SessionDep
-from utils.pagination import paginate_response, pagination_dep
-from utils.utils import get_utc_now
+from db import ReadSessionDep, SessionDep, get_async_session
+from utils.pagination import (
+    TotalEnum,
+    is_cursor_pagination,
+    paginate_by_cursor,
+    paginate_response,
+    pagination_dep,
+)
+from utils.response import model_response
+from utils.utils import escape_like, get_utc_now
 
 
 chat_router = APIRouter()
 
 
-def patch_model(model, data, db_session):
+async def patch_model(model, data, db_session):
     update_data = data.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(model, key, value)
     db_session.add(model)
-    db_session.commit()
-    db_session.refresh(model)
+    await db_session.commit()
     return model
 
 
-def get_user_chat_rooms(
+async def get_user_chat_rooms(
     current_user: Annotated[User, Depends(get_current_user)],
-    db_session: SessionDep,
+    db_session: ReadSessionDep,
 ):
-    statement = select(ChatRoom).join(RoomRole).where(RoomRole.user_id == current_user.id)
-    chat_rooms = db_session.exec(statement).all()
+    statement = (
+        select(ChatRoom)
+        .join(RoomRole)
+        .where(RoomRole.user_id == current_user.id)
+        .options(selectinload(ChatRoom.roles))
+    )
+    chat_rooms = (await db_session.exec(statement)).all()
     return chat_rooms
 
 
-@chat_router.get('/rooms', name='chat:rooms_list_api', response_model=List[PublicChatRoom])
-async def chat_room_list_api(rooms: Annotated[list, Depends(get_user_chat_rooms)]):
-    return rooms
+async def get_rooms_summary(rooms: list[ChatRoom], current_user: User, db_session):
+    """last message and unread count of every room in a single query.
+    """
+    if not rooms:
+        return []
+    last_message_query = (
+        select(Message)
+        .where(Message.chat_room_id == RoomRole.chat_room_id)
+        .order_by(desc(Message.created_at), desc(Message.id))
+        .limit(1)
+        .lateral()
+    )
+    last_message = aliased(Message, last_message_query, name='last_message')
+    unread_count = (
+        select(func.count(Message.id))
+        .where(
+            Message.chat_room_id == RoomRole.chat_room_id,
+            # messages from before joining are not unread
+            tuple_(Message.created_at, Message.id) > tuple_(
+                func.coalesce(RoomRole.last_read_at, RoomRole.created_at),
+                func.coalesce(RoomRole.last_read_message_id, 0),
+            ),
+            Message.created_by_id.is_distinct_from(current_user.id),
+        )
+        .correlate(RoomRole)
+        .scalar_subquery()
+    )
+    statement = (
+        select(
+            RoomRole.chat_room_id,
+            RoomRole.last_read_message_id,
+            last_message,
+            unread_count.label('unread_count'),
+        )
+        .outerjoin(last_message, true())
+        .where(
+            RoomRole.user_id == current_user.id,
+            RoomRole.chat_room_id.in_([room.id for room in rooms]),
+        )
+    )
+    summaries = {
+        row.chat_room_id: row
+        for row in (await db_session.exec(statement)).all()
+    }
+    results = []
+    for room in rooms:
+        summary = summaries.get(room.id)
+        if summary is None:
+            # the role was removed after the page was loaded
+            continue
+        results.append(ChatRoomSummary.model_validate(room).model_copy(update={
+            'last_message': summary.last_message and PublicMessage.model_validate(summary.last_message),
+            'last_read_message_id': summary.last_read_message_id,
+            'unread_count': summary.unread_count,
+        }))
+    return results
+
+
+@chat_router.get('/rooms', name='chat:rooms_list_api', response_model=ChatRoomsList | List[PublicChatRoom])
+async def chat_room_list_api(
+    pagination: Annotated[dict, Depends(pagination_dep)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    db_session: ReadSessionDep,
+):
+    """all rooms by default. with `before` or `after` cursor, a page of rooms summaries, most active first.
+    rooms with activity while paging move to the front, so the following `before` pages skip them,
+    they are returned `after` the newest cursor instead.
+    """
+    if not is_cursor_pagination(pagination):
+        return model_response(List[PublicChatRoom], await get_user_chat_rooms(current_user, db_session))
+    rooms_query = (
+        select(ChatRoom)
+        .join(RoomRole)
+        .where(RoomRole.user_id == current_user.id)
+        .options(selectinload(ChatRoom.roles))
+    )
+    page = await paginate_by_cursor(
+        rooms_query,
+        columns=(ChatRoom.last_activity_at, ChatRoom.id),
+        pagination=pagination,
+        db_session=db_session,
+    )
+    page['results'] = await get_rooms_summary(page['results'], current_user, db_session)
+    return model_response(ChatRoomsList, page)
 
 
 @chat_router.post('/rooms', name='chat:create_room_api', response_model=PublicChatRoom, status_code=201)
@@ -71,17 +194,17 @@ async def create_chat_room_api(
     new_room.created_by_id = current_user.id
     db_session.add(new_room)
     new_role = RoomRole(
-        user=current_user,
+        user_id=current_user.id,
         chat_room=new_room,
         role=RoomRoleEnum.ADMIN,
     )
     db_session.add(new_role)
-    db_session.commit()
-    db_session.refresh(new_room)
+    await db_session.commit()
+    # roles of a new room are populated by the new role back reference
     return new_room
 
 
-def get_user_chat_room(
+async def get_user_chat_room(
     room_id: int,
     current_user: Annotated[User, Depends(get_current_user)],
     db_session: SessionDep,
@@ -93,8 +216,9 @@ def get_user_chat_room(
             RoomRole.user_id == current_user.id,
             ChatRoom.id == room_id,
         )
+        .options(selectinload(ChatRoom.roles))
     )
-    chat_room = db_session.exec(statement).first()
+    chat_room = (await db_session.exec(statement)).first()
     if not chat_room:
         raise HTTPException(404, 'Not Found')
     return chat_room
@@ -110,37 +234,49 @@ async def get_chat_room_api(
 def get_user_chat_room_with_access(
     allow_for_roles=None,
 ):
-    def handler(
+    async def handler(
         room_id: int,
         current_user: Annotated[User, Depends(get_current_user)],
         db_session: SessionDep,
     ):
-        role_query = (
-            select(RoomRole)
-            .where(
-                RoomRole.user_id == current_user.id,
-                RoomRole.chat_room_id == room_id,
-            )
-        )
-        room_role = db_session.exec(role_query).first()
-        if not room_role:
+        membership = await get_room_membership(current_user.id, room_id, db_session)
+        if not membership:
             raise HTTPException(404, 'Not Found')
         # allow access if not set
-        if not allow_for_roles:
-            return room_role.chat_room
-        if room_role.role not in allow_for_roles:
+        if allow_for_roles and membership.role not in allow_for_roles:
             raise HTTPException(403, 'Not enough permissions to perform the action')
-        return room_role.chat_room
+        room_query = (
+            select(ChatRoom)
+            .where(ChatRoom.id == room_id)
+            .options(selectinload(ChatRoom.roles))
+        )
+        chat_room = (await db_session.exec(room_query)).first()
+        if not chat_room:
+            raise HTTPException(404, 'Not Found')
+        return chat_room
     return handler
 
 
+async def get_user_room_membership(
+    room_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db_session: SessionDep,
+):
+    """cached membership check, without loading the room.
+    """
+    membership = await get_room_membership(current_user.id, room_id, db_session)
+    if not membership:
+        raise HTTPException(404, 'Not Found')
+    return membership
+
+
 @chat_router.patch('/rooms/{room_id}', name='chat:delete_room_api', response_model=PublicChatRoom)
 async def update_chat_room_api(
     data: ChatRoomUpdate,
     room: Annotated[ChatRoom, Depends(get_user_chat_room_with_access(allow_for_roles=[RoomRoleEnum.MODERATOR, RoomRoleEnum.ADMIN]))],
     db_session: SessionDep,
 ):
-    return patch_model(room, data, db_session)
+    return await patch_model(room, data, db_session)
 
 
 
@@ -148,9 +284,22 @@ async def update_chat_room_api(
 async def delete_chat_room_api(
     room: Annotated[ChatRoom, Depends(get_user_chat_room_with_access([RoomRoleEnum.ADMIN]))],
     db_session: SessionDep,
+    background_tasks: BackgroundTasks,
 ):
-    db_session.delete(room)
-    db_session.commit()
+    room_id = room.id
+    # rooms are only reachable through roles, so the room is gone for everyone right away
+    member_ids = (await db_session.exec(
+        delete(RoomRole)
+        .where(RoomRole.chat_room_id == room_id)
+        .returning(RoomRole.user_id)
+    )).scalars().all()
+    await db_session.exec(delete(RoomInvite).where(RoomInvite.chat_room_id == room_id))
+    # picked up by the sweeper if the purge below doesn't finish
+    await db_session.exec(update(ChatRoom).where(ChatRoom.id == room_id).values(deleted_at=func.now()))
+    await db_session.commit()
+    await get_membership_cache().invalidate([(user_id, room_id) for user_id in member_ids])
+    background_tasks.add_task(purge_chat_room, room_id)
+    await publish_room_deleted(room_id)
     return None
 
 
@@ -166,7 +315,7 @@ async def create_invite_api(
         RoomInvite.chat_room_id == room.id,
         RoomInvite.expires_at > max_expiry,
     )
-    valid_invite = db_session.exec(valid_invite_query).first()
+    valid_invite = (await db_session.exec(valid_invite_query)).first()
     if valid_invite:
         return valid_invite
     new_invite = RoomInvite(
@@ -174,7 +323,7 @@ async def create_invite_api(
         chat_room_id=room.id,
     )
     db_session.add(new_invite)
-    db_session.commit()
+    await db_session.commit()
     return new_invite
 
 
@@ -185,10 +334,14 @@ async def accept_invite_api(
     db_session: SessionDep,
 ):
     now = get_utc_now()
-    invite_query = select(RoomInvite).where(
-        RoomInvite.id == invite_id,
+    invite_query = (
+        select(RoomInvite)
+        .where(
+            RoomInvite.id == invite_id,
+        )
+        .options(selectinload(RoomInvite.chat_room))
     )
-    invite = db_session.exec(invite_query).first()
+    invite = (await db_session.exec(invite_query)).first()
     if not invite:
         raise HTTPException(404, 'Not Found')
     if invite.expires_at < now:
@@ -201,7 +354,7 @@ async def accept_invite_api(
             RoomRole.chat_room_id == chat_room.id,
         )
     )
-    room_role = db_session.exec(role_query).first()
+    room_role = (await db_session.exec(role_query)).first()
     if room_role:
         raise HTTPException(412, {
             'message': 'Already in the room',
@@ -220,139 +373,239 @@ async def accept_invite_api(
         content=f'User {current_user.name} entered the chat.',
     )
     db_session.add(enter_message)
-    db_session.commit()
-    db_session.refresh(chat_room)
+    await db_session.commit()
+    await get_membership_cache().invalidate([(current_user.id, chat_room.id)])
+    await db_session.refresh(chat_room, attribute_names=['roles'])
+    await publish_message_event(RoomEventTypeEnum.MESSAGE_CREATED, enter_message)
     return chat_room
 
 
 @chat_router.post('/room/{room_id}/message', name='chat:create_message_api', response_model=PublicMessage, status_code=201)
 async def create_message_api(
     data: CreateMessageBody,
-    current_user: Annotated[User, Depends(get_current_user)],
-    room: Annotated[ChatRoom, Depends(get_user_chat_room)],
+    membership: Annotated[RoomMembership, Depends(get_user_room_membership)],
     db_session: SessionDep,
 ):
     message = Message(
-        chat_room=room,
-        created_by_id=current_user.id,
+        chat_room_id=membership.chat_room_id,
+        created_by_id=membership.user_id,
         content=data.content
     )
     db_session.add(message)
-    db_session.commit()
-    db_session.refresh(message)
+    await db_session.commit()
+    await publish_message_event(RoomEventTypeEnum.MESSAGE_CREATED, message)
     return message
 
 
+@chat_router.post(
+    '/room/{room_id}/message/batch',
+    name='chat:create_messages_batch_api',
+    response_model=List[PublicMessage],
+    status_code=201,
+)
+async def create_messages_batch_api(
+    data: CreateMessagesBatchBody,
+    membership: Annotated[RoomMembership, Depends(get_user_room_membership)],
+    db_session: SessionDep,
+):
+    """creates messages with a single multi-row insert, for integrations posting a lot of them.
+    """
+    rows = [
+        {
+            'chat_room_id': membership.chat_room_id,
+            'created_by_id': membership.user_id,
+            'type': MessageTypeEnum.TEXT,
+            'content': message_data.content,
+        }
+        for message_data in data.messages
+    ]
+    messages = (await db_session.scalars(
+        insert(Message).returning(Message, sort_by_parameter_order=True),
+        rows,
+    )).all()
+    # bulk inserts skip mapper events, so the room activity and count are updated here
+    await db_session.exec(
+        update(ChatRoom)
+        .where(ChatRoom.id == membership.chat_room_id)
+        .values(
+            last_activity_at=func.greatest(ChatRoom.last_activity_at, messages[-1].created_at),
+            message_count=ChatRoom.message_count + len(messages),
+        )
+    )
+    await db_session.commit()
+    await publish_messages_event(
+        RoomEventTypeEnum.MESSAGE_CREATED,
+        membership.chat_room_id,
+        [message.id for message in messages],
+    )
+    return messages
+
+
 @chat_router.get('/room/{room_id}/message', name='chat:list_messages_api', response_model=MessagesList)
 async def list_messages_api(
     pagination: Annotated[dict, Depends(pagination_dep)],
-    room: Annotated[ChatRoom, Depends(get_user_chat_room)],
-    db_session: SessionDep,
+    membership: Annotated[RoomMembership, Depends(get_user_room_membership)],
+    db_session: ReadSessionDep,
     search: str | None = None,
 ):
+    # plain rows, no identity map or instrumented attributes to set up for a read only page
     messages_query = (
-        select(Message)
+        select(*PUBLIC_MESSAGE_COLUMNS)
         .where(
-            Message.chat_room_id == room.id,
+            Message.chat_room_id == membership.chat_room_id,
         )
-        .order_by(desc(Message.created_at))
     )
+    order_by = (desc(Message.created_at), desc(Message.id))
     if search:
+        search_query = websearch_to_tsquery(MESSAGE_SEARCH_CONFIG, search)
+        search_filter = message_search_vector.op('@@')(search_query)
+        if len(search.strip()) >= MESSAGE_SUBSTRING_SEARCH_MIN_LENGTH:
+            # substring fallback for partial words, backed by the trigram index
+            search_filter = or_(search_filter, Message.content.ilike(f'%{escape_like(search)}%'))
         messages_query = messages_query.where(
             Message.type == MessageTypeEnum.TEXT,
-            Message.content.ilike(f'%{search}%'),
+            search_filter,
+        )
+        # substring only matches rank 0, so they come after word matches
+        order_by = (desc(func.ts_rank(message_search_vector, search_query)), *order_by)
+    if is_cursor_pagination(pagination):
+        # cursors follow the timeline, so results are not ranked there
+        page = await paginate_by_cursor(
+            messages_query,
+            columns=(Message.created_at, Message.id),
+            pagination=pagination,
+            db_session=db_session,
         )
-    return paginate_response(
-        messages_query,
+        return model_response(MessagesList, page)
+    total = None
+    if not search and pagination['total'] is not TotalEnum.NONE:
+        # the denormalized count is exact and doesn't depend on the room size
+        total = (await db_session.exec(
+            select(ChatRoom.message_count).where(ChatRoom.id == membership.chat_room_id)
+        )).one()
+    page = await paginate_response(
+        messages_query.order_by(*order_by),
         pagination=pagination,
         db_session=db_session,
+        total=total,
+    )
+    return model_response(MessagesList, page)
+
+
+@chat_router.get('/room/{room_id}/message/export', name='chat:export_messages_api', response_class=StreamingResponse)
+async def export_messages_api(
+    membership: Annotated[RoomMembership, Depends(get_user_room_membership)],
+    format: ExportFormatEnum = ExportFormatEnum.NDJSON,
+):
+    """whole room history, oldest first, streamed so memory doesn't grow with the room.
+    """
+    if not await acquire_export_slot():
+        raise HTTPException(429, 'Too many exports in progress, try again later')
+    filename = f'room-{membership.chat_room_id}-messages.{format.value}'
+    return StreamingResponse(
+        release_export_slot_when_done(EXPORTERS[format](membership.chat_room_id)),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
     )
 
 
+@chat_router.post('/room/{room_id}/read', name='chat:mark_read_api', response_model=None, status_code=202)
+async def mark_read_api(
+    data: MarkReadBody,
+    membership: Annotated[RoomMembership, Depends(get_user_room_membership)],
+):
+    """advances the read position up to the message. written in batches, so not visible right away.
+    """
+    get_read_state_buffer().mark_read(membership.id, data.message_id)
+    return None
+
+
 @chat_router.patch('/message/{message_id}', name='chat:update_message_api', response_model=PublicMessage)
 async def update_message_api(
     data: MessageUpdateBody,
     current_user: Annotated[User, Depends(get_current_user)],
-    message_id,
+    message_id: int,
     db_session: SessionDep,
 ):
-    message = db_session.exec(
+    message = (await db_session.exec(
         select(Message)
         .where(
             Message.id == message_id,
             Message.created_by_id == current_user.id,
             Message.type == MessageTypeEnum.TEXT,
         )
-    ).first()
+    )).first()
     if not message:
         raise HTTPException(404, 'Not Found')
-    return patch_model(message, data, db_session)
+    message = await patch_model(message, data, db_session)
+    await publish_message_event(RoomEventTypeEnum.MESSAGE_UPDATED, message)
+    return message
 
 
 @chat_router.delete('/message/{message_id}', name='chat:delete_message_api', response_model=None, status_code=204)
 async def delete_message_api(
     current_user: Annotated[User, Depends(get_current_user)],
-    message_id,
+    message_id: int,
     db_session: SessionDep,
 ):
-    message = db_session.exec(
+    message = (await db_session.exec(
         select(Message)
         .where(
             Message.id == message_id,
             Message.type == MessageTypeEnum.TEXT,
         )
-    ).first()
+    )).first()
     if not message:
         raise HTTPException(404, 'Not Found')
     if message.created_by_id != current_user.id:
-        chat_role = db_session.exec(
-            select(RoomRole)
-            .where(
-                RoomRole.user_id == current_user.id,
-                RoomRole.chat_room_id == message.chat_room_id,
-                RoomRole.role.in_([RoomRoleEnum.ADMIN, RoomRoleEnum.MODERATOR]),
-            )
-        ).first()
-        if not chat_role:
+        membership = await get_room_membership(current_user.id, message.chat_room_id, db_session)
+        if not membership or membership.role not in [RoomRoleEnum.ADMIN, RoomRoleEnum.MODERATOR]:
             raise HTTPException(404, 'Not Found')
-    db_session.delete(message)
-    db_session.commit()
+    room_id, deleted_message_id = message.chat_room_id, message.id
+    await db_session.delete(message)
+    await db_session.commit()
+    await publish_message_deleted(room_id, message_id=deleted_message_id)
     return None
 
 
 RolePair = namedtuple('RolePair', ['room_role', 'current_user_role'])
 
 
-def get_room_role(
-    role_id: int,
-    current_user: Annotated[User, Depends(get_current_user)],
-    db_session: SessionDep,
-):
+async def find_room_role(role_id: int, current_user: User, db_session, read_session) -> RolePair:
+    """the role is loaded with read_session, access is always checked on the primary.
+    """
     role_query = (
         select(RoomRole)
         .where(
             RoomRole.id == role_id,
         )
+        .options(selectinload(RoomRole.user))
     )
-    room_role = db_session.exec(role_query).first()
+    room_role = (await read_session.exec(role_query)).first()
     if not room_role:
         raise HTTPException(404, 'Not Found')
-    user_room_role = db_session.exec(
-        select(RoomRole)
-        .where(
-            RoomRole.user_id == current_user.id,
-            RoomRole.chat_room_id == room_role.chat_room_id,
-        ),
-    ).first()
-    if not user_room_role:
+    membership = await get_room_membership(current_user.id, room_role.chat_room_id, db_session)
+    if not membership:
         raise HTTPException(404, 'Not Found')
-    return RolePair(room_role, user_room_role)
+    return RolePair(room_role, membership)
+
+
+async def get_room_role(
+    role_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db_session: SessionDep,
+):
+    return await find_room_role(role_id, current_user, db_session, read_session=db_session)
 
 
 @chat_router.get('/room-role/{role_id}', name='chat:get_room_role_api', response_model=PublicRoomRole)
 async def get_room_role_api(
-    role_pair: Annotated[RolePair, Depends(get_room_role)],
+    role_id: int,
+    current_user: Annotated[User, Depends(get_current_user)],
+    db_session: SessionDep,
+    read_session: ReadSessionDep,
 ):
+    role_pair = await find_room_role(role_id, current_user, db_session, read_session)
     return role_pair.room_role
 
 
@@ -364,7 +617,9 @@ async def update_room_role_api(
 ):
     if role_pair.current_user_role.role is not RoomRoleEnum.ADMIN:
         raise HTTPException(403, 'Not enough permissions to perform the action')
-    return patch_model(role_pair.room_role, data, db_session)
+    room_role = await patch_model(role_pair.room_role, data, db_session)
+    await get_membership_cache().invalidate([(room_role.user_id, room_role.chat_room_id)])
+    return room_role
 
 
 @chat_router.delete('/room-role/{role_id}', name='chat:delete_room_role_api', response_model=None, status_code=204)
@@ -374,17 +629,41 @@ async def delete_room_role_api(
     db_session: SessionDep,
 ):
     if (
-        (role_pair.current_user_role != role_pair.room_role)
+        (role_pair.current_user_role.id != role_pair.room_role.id)
         and (role_pair.current_user_role.role not in [RoomRoleEnum.ADMIN, RoomRoleEnum.MODERATOR])
     ):
         raise HTTPException(403, 'Not enough permissions to perform the action')
-    db_session.delete(role_pair.room_role)
+    room_id = role_pair.room_role.chat_room_id
+    removed_user_id = role_pair.room_role.user_id
+    await db_session.delete(role_pair.room_role)
     exit_message = Message(
-        chat_room_id=role_pair.room_role.chat_room_id,
+        chat_room_id=room_id,
         created_by_id=current_user.id,
         type=MessageTypeEnum.SYSTEM_ANNOUNCEMENT,
         content=f'User {role_pair.room_role.user.name} left the chat.',
     )
     db_session.add(exit_message)
-    db_session.commit()
+    await db_session.commit()
+    await get_membership_cache().invalidate([(removed_user_id, room_id)])
+    await publish_message_event(RoomEventTypeEnum.MESSAGE_CREATED, exit_message)
+    await publish_role_deleted(room_id, user_id=removed_user_id)
     return None
+
+
+@chat_router.websocket('/room/{room_id}/ws', name='chat:room_events_ws')
+async def room_events_ws(
+    websocket: WebSocket,
+    room_id: int,
+):
+    current_user = websocket.scope.get('user')
+    if not current_user or current_user.id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    # not a session dependency: it would hold a connection for the socket lifetime
+    async with get_async_session() as db_session:
+        membership = await get_room_membership(current_user.id, room_id, db_session)
+    if not membership:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    await stream_room_events(websocket, room_id=room_id, user_id=current_user.id)
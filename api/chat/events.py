@@ -0,0 +1,206 @@
+import asyncio
+import enum
+from functools import lru_cache
+import json
+import logging
+import time
+import uuid
+
+from fastapi import WebSocket
+from sqlmodel import select
+
+from chat.models import Message
+from chat.schemas import PublicMessage
+from db import get_async_session
+from utils.broadcast import get_broadcast
+
+logger = logging.getLogger(__name__)
+
+# keeps events referencing messages well under the NOTIFY payload limit, for ids up to 10 digits
+MESSAGE_IDS_PER_EVENT = 500
+# loaded messages are shared by the subscribers of a process receiving the same event
+MESSAGE_EVENTS_CACHE_SECONDS = 5
+
+
+class RoomEventTypeEnum(str, enum.Enum):
+    MESSAGE_CREATED = 'message.created'
+    MESSAGE_UPDATED = 'message.updated'
+    MESSAGE_DELETED = 'message.deleted'
+    ROLE_DELETED = 'room_role.deleted'
+    ROOM_DELETED = 'room.deleted'
+
+
+def get_room_channel(room_id: int):
+    return f'chat_room_{room_id}'
+
+
+async def publish_room_payload(room_id: int, payload: str):
+    """publishes after the change is committed, so a failure is only logged.
+    """
+    try:
+        await get_broadcast().publish(channel=get_room_channel(room_id), message=payload)
+    except Exception:
+        logger.exception(f'Failed to publish an event to room {room_id}.')
+
+
+async def publish_room_event(room_id: int, event: dict):
+    await publish_room_payload(room_id, json.dumps(event))
+
+
+def serialize_message_event(event_type: RoomEventTypeEnum, message: Message):
+    return {
+        'type': event_type.value,
+        'chat_room_id': message.chat_room_id,
+        'message': PublicMessage.model_validate(message).model_dump(mode='json'),
+    }
+
+
+def serialize_message_reference_event(event_type: RoomEventTypeEnum, room_id: int, message_ids: list[int]):
+    # subscribers load the messages themselves, see MessageEventsLoader.
+    # the id tells apart events published for the same messages again, e.g. on updates
+    return {
+        'id': uuid.uuid4().hex,
+        'type': event_type.value,
+        'chat_room_id': room_id,
+        'message_ids': message_ids,
+    }
+
+
+async def publish_messages_event(event_type: RoomEventTypeEnum, room_id: int, message_ids: list[int]):
+    """one event for many messages instead of one per message, subscribers load them.
+    """
+    for start in range(0, len(message_ids), MESSAGE_IDS_PER_EVENT):
+        await publish_room_event(
+            room_id,
+            serialize_message_reference_event(event_type, room_id, message_ids[start:start + MESSAGE_IDS_PER_EVENT]),
+        )
+
+
+async def publish_message_event(event_type: RoomEventTypeEnum, message: Message):
+    payload = json.dumps(serialize_message_event(event_type, message))
+    if not get_broadcast().can_publish(payload):
+        payload = json.dumps(serialize_message_reference_event(event_type, message.chat_room_id, [message.id]))
+    await publish_room_payload(message.chat_room_id, payload)
+
+
+async def publish_message_deleted(room_id: int, message_id: int):
+    await publish_room_event(room_id, {
+        'type': RoomEventTypeEnum.MESSAGE_DELETED.value,
+        'chat_room_id': room_id,
+        'message': {'id': message_id},
+    })
+
+
+async def publish_role_deleted(room_id: int, user_id: int):
+    await publish_room_event(room_id, {
+        'type': RoomEventTypeEnum.ROLE_DELETED.value,
+        'chat_room_id': room_id,
+        'user_id': user_id,
+    })
+
+
+async def publish_room_deleted(room_id: int):
+    await publish_room_event(room_id, {
+        'type': RoomEventTypeEnum.ROOM_DELETED.value,
+        'chat_room_id': room_id,
+    })
+
+
+async def load_message_events(event: dict) -> list[dict]:
+    """resolves an event referencing messages into an event per message.
+    messages deleted in the meantime are skipped, their own events follow.
+    """
+    event_type = RoomEventTypeEnum(event['type'])
+    async with get_async_session() as db_session:
+        messages = (await db_session.exec(
+            select(Message)
+            .where(
+                Message.chat_room_id == event['chat_room_id'],
+                Message.id.in_(event['message_ids']),
+            )
+            .order_by(Message.id)
+        )).all()
+    return [serialize_message_event(event_type, message) for message in messages]
+
+
+class MessageEventsLoader:
+    """resolves events referencing messages once per process, however many subscribers receive them.
+    subscribers receiving an event while it's loaded wait for the same load,
+    later ones reuse the result for a few seconds.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # in insertion order, so the oldest expire first
+        self._loads = {}
+
+    def _expire(self, now: float):
+        for key, (expires_at, _) in list(self._loads.items()):
+            if expires_at > now:
+                break
+            del self._loads[key]
+
+    def _forget_failed(self, key: str, task: asyncio.Future):
+        # failed loads are retried by the next subscriber
+        if (task.cancelled() or task.exception() is not None) and self._loads.get(key, (None, None))[1] is task:
+            del self._loads[key]
+
+    async def load(self, event: dict) -> list[dict]:
+        now = time.monotonic()
+        self._expire(now)
+        key = event['id']
+        _, task = self._loads.get(key, (None, None))
+        # every test client runs its own event loop
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(load_message_events(event))
+            task.add_done_callback(lambda task: self._forget_failed(key, task))
+            self._loads[key] = (now + self.ttl, task)
+        # a subscriber disconnecting doesn't cancel the load for the others
+        return await asyncio.shield(task)
+
+
+@lru_cache
+def get_message_events_loader() -> MessageEventsLoader:
+    return MessageEventsLoader(ttl=MESSAGE_EVENTS_CACHE_SECONDS)
+
+
+def is_closing_event(event: dict, user_id: int):
+    if event['type'] == RoomEventTypeEnum.ROOM_DELETED.value:
+        return True
+    return event['type'] == RoomEventTypeEnum.ROLE_DELETED.value and event['user_id'] == user_id
+
+
+async def stream_room_events(websocket: WebSocket, room_id: int, user_id: int):
+    """forwards room events to the websocket until either side disconnects.
+    the connection is closed once the user loses access to the room.
+    """
+    async with get_broadcast().subscribe(get_room_channel(room_id)) as subscriber:
+
+        async def receive_until_disconnect():
+            while True:
+                message = await websocket.receive()
+                if message['type'] == 'websocket.disconnect':
+                    return
+
+        async def send_events():
+            while True:
+                event = json.loads((await subscriber.get()).message)
+                if 'message_ids' in event:
+                    events = await get_message_events_loader().load(event)
+                else:
+                    events = [event]
+                for event in events:
+                    await websocket.send_json(event)
+                    if is_closing_event(event, user_id):
+                        await websocket.close()
+                        return
+
+        tasks = [
+            asyncio.create_task(receive_until_disconnect()),
+            asyncio.create_task(send_events()),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
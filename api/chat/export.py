@@ -0,0 +1,107 @@
+import asyncio
+import csv
+import enum
+import io
+from functools import lru_cache
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel import select
+
+from chat.models import Message
+from chat.schemas import PUBLIC_MESSAGE_COLUMNS, PublicMessage
+from conf import settings
+from db import create_measured_engine, get_async_connect_args, get_async_db_connection_dsn
+
+
+class ExportFormatEnum(str, enum.Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormatEnum.NDJSON: 'application/x-ndjson',
+    ExportFormatEnum.CSV: 'text/csv',
+}
+
+
+@lru_cache
+def get_export_limiter() -> asyncio.Semaphore:
+    return asyncio.Semaphore(settings.chat_message_export_max_concurrency)
+
+
+@lru_cache
+def get_export_engine():
+    """primary engine for exports, with a pool of its own, even with replicas.
+    a download keeps its connection until the last batch, so exports can't starve the request pools.
+    """
+    return create_measured_engine(
+        create_async_engine,
+        get_async_db_connection_dsn(),
+        name='export',
+        pool_class=settings.db_async_pool_class or AsyncAdaptedQueuePool,
+        connect_args=get_async_connect_args(),
+        pool_size=settings.chat_message_export_max_concurrency,
+        max_overflow=0,
+    )
+
+
+async def acquire_export_slot() -> bool:
+    """takes an export slot without waiting, False when all of them are taken.
+    """
+    limiter = get_export_limiter()
+    if limiter.locked():
+        return False
+    # returns right away with a free slot, nothing can take it in between
+    await limiter.acquire()
+    return True
+
+
+async def release_export_slot_when_done(chunks):
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        get_export_limiter().release()
+
+
+async def stream_message_batches(room_id: int):
+    """room messages in chronological order, read with a server side cursor in batches.
+    opens its own connection, the request session is closed before the response is streamed.
+    """
+    statement = (
+        select(*PUBLIC_MESSAGE_COLUMNS)
+        .where(Message.chat_room_id == room_id)
+        .order_by(Message.created_at, Message.id)
+        .execution_options(yield_per=settings.chat_message_export_batch_size)
+    )
+    async with get_export_engine().connect() as connection:
+        result = await connection.stream(statement)
+        async for rows in result.partitions():
+            yield [PublicMessage.model_validate(row) for row in rows]
+
+
+async def export_messages_ndjson(room_id: int):
+    async for messages in stream_message_batches(room_id):
+        yield b''.join(message.model_dump_json().encode() + b'\n' for message in messages)
+
+
+async def export_messages_csv(room_id: int):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PublicMessage.model_fields)
+    async for messages in stream_message_batches(room_id):
+        writer.writerows(message.model_dump(mode='json').values() for message in messages)
+        yield buffer.getvalue()
+        # only the current batch is kept in memory
+        buffer.seek(0)
+        buffer.truncate()
+    # header only, for empty rooms
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+EXPORTERS = {
+    ExportFormatEnum.NDJSON: export_messages_ndjson,
+    ExportFormatEnum.CSV: export_messages_csv,
+}
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import logging
+from functools import lru_cache
+from typing import NamedTuple
+
+from sqlalchemy import event
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from chat.models import RoomRole, RoomRoleEnum
+from conf import settings
+from utils.broadcast import get_broadcast
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class RoomMembership(NamedTuple):
+    id: int
+    user_id: int
+    chat_room_id: int
+    role: RoomRoleEnum
+
+
+class MembershipCache:
+    """room roles by (user_id, room_id), so access checks don't need a query every time.
+    entries are dropped on role changes, other processes are notified through the broadcast.
+    nothing is cached unless the broadcast reaches every app process, the others would keep removed members
+    until the ttl passes.
+    """
+    channel = 'chat_room_memberships'
+
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._listener_task = None
+
+    @property
+    def is_enabled(self) -> bool:
+        return get_broadcast().reaches_all_processes
+
+    def get(self, user_id: int, room_id: int) -> RoomMembership | None:
+        if not self.is_enabled:
+            return None
+        return self._cache.get((user_id, room_id))
+
+    def set(self, membership: RoomMembership):
+        if self.is_enabled:
+            self._cache.set((membership.user_id, membership.chat_room_id), membership)
+
+    def delete(self, user_id: int, room_id: int):
+        self._cache.delete((user_id, room_id))
+
+    def clear(self):
+        self._cache.clear()
+
+    async def invalidate(self, keys: list[tuple[int, int]]):
+        """drops memberships everywhere, should be called after the change is committed.
+        """
+        for user_id, room_id in keys:
+            self.delete(user_id, room_id)
+        broadcast = get_broadcast()
+        if keys and broadcast.is_connected:
+            try:
+                await broadcast.publish(self.channel, json.dumps(keys))
+            except Exception:
+                logger.exception('Failed to publish membership invalidation.')
+
+    async def _listen(self):
+        async with get_broadcast().subscribe(self.channel) as subscriber:
+            async for event in subscriber:
+                for user_id, room_id in json.loads(event.message):
+                    self.delete(user_id, room_id)
+
+    async def start(self):
+        self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            self._listener_task = None
+
+
+@lru_cache
+def get_membership_cache() -> MembershipCache:
+    return MembershipCache(
+        max_size=settings.chat_membership_cache_max_size,
+        ttl=settings.chat_membership_cache_ttl_seconds,
+    )
+
+
+@event.listens_for(RoomRole, 'after_insert')
+@event.listens_for(RoomRole, 'after_update')
+@event.listens_for(RoomRole, 'after_delete')
+def invalidate_cached_membership(mapper, connection, target: RoomRole):
+    get_membership_cache().delete(target.user_id, target.chat_room_id)
+
+
+async def get_room_membership(
+    user_id: int,
+    room_id: int,
+    db_session: AsyncSession,
+) -> RoomMembership | None:
+    membership_cache = get_membership_cache()
+    membership = membership_cache.get(user_id, room_id)
+    if membership is not None:
+        return membership
+    room_role = (await db_session.exec(
+        select(RoomRole)
+        .where(
+            RoomRole.user_id == user_id,
+            RoomRole.chat_room_id == room_id,
+        )
+    )).first()
+    if room_role is None:
+        return None
+    membership = RoomMembership(
+        id=room_role.id,
+        user_id=room_role.user_id,
+        chat_room_id=room_role.chat_room_id,
+        role=room_role.role,
+    )
+    membership_cache.set(membership)
+    return membership
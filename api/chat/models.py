@@ -2,7 +2,8 @@ import datetime
 import enum
 from typing import TYPE_CHECKING, Optional
 import uuid
-from sqlalchemy import String
+from sqlalchemy import Computed, Index, PrimaryKeyConstraint, String, event, func, text, update
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlmodel import (
     Enum,
     Field,
@@ -15,6 +16,7 @@ from sqlmodel import (
 
 from conf import settings
 from utils.models import TimestampsMixin
+from utils.utils import get_utc_now
 
 if TYPE_CHECKING:
     from auth.models import User
@@ -22,6 +24,10 @@ if TYPE_CHECKING:
 
 class ChatRoom(TimestampsMixin, SQLModel, table=True):
     __tablename__ = 'chat_room'
+    __table_args__ = (
+        # only rooms waiting for a purge are indexed
+        Index('ix_chat_room_deleted_at', 'deleted_at', postgresql_where=text('deleted_at IS NOT NULL')),
+    )
 
     id: int | None = Field(default=None, primary_key=True)
     name: str = Field(
@@ -37,17 +43,39 @@ class ChatRoom(TimestampsMixin, SQLModel, table=True):
         foreign_key='auth_users.id',
         ondelete="SET NULL",
     )
+    # denormalized from messages to order rooms by activity, kept up to date on message insert
+    last_activity_at: datetime.datetime = Field(
+        default_factory=get_utc_now,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={'server_default': func.now()},
+        nullable=False,
+    )
+    # denormalized as well, so message lists don't need to count the room messages
+    message_count: int = Field(
+        default=0,
+        sa_column_kwargs={'server_default': '0'},
+        nullable=False,
+    )
+    # set once the room is deleted, the room and its messages are purged afterwards, see chat.purge
+    deleted_at: datetime.datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),
+        nullable=True,
+    )
     messages: list['Message'] = Relationship(
         back_populates='chat_room',
         cascade_delete=True,
+        passive_deletes=True,
     )
     roles: list['RoomRole'] = Relationship(
         back_populates='chat_room',
         cascade_delete=True,
+        passive_deletes=True,
     )
     invites: list['RoomInvite'] = Relationship(
         back_populates='chat_room',
         cascade_delete=True,
+        passive_deletes=True,
     )
 
 
@@ -57,7 +85,22 @@ class MessageTypeEnum(enum.Enum):
 
 
 class Message(TimestampsMixin, SQLModel, table=True):
-    id: int | None = Field(default=None, primary_key=True)
+    # partitioned by month, see chat.partitions. the partition key has to be a part of the primary key,
+    # messages are still identified by id alone, which is unique through the sequence
+    __table_args__ = (
+        PrimaryKeyConstraint('id', 'created_at'),
+        # room timeline, newest first
+        Index(
+            'ix_message_chat_room_id_created_at_id',
+            'chat_room_id',
+            text('created_at DESC'),
+            text('id DESC'),
+        ),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+    __mapper_args__ = {**TimestampsMixin.__mapper_args__, 'primary_key': ['id']}
+
+    id: int | None = Field(default=None, nullable=False, sa_column_kwargs={'autoincrement': True})
     content: str
     type: MessageTypeEnum = Field(
         default=MessageTypeEnum.TEXT,
@@ -76,6 +119,47 @@ class Message(TimestampsMixin, SQLModel, table=True):
     chat_room: ChatRoom = Relationship(back_populates='messages')
 
 
+# no stemming, rooms are not limited to a single language
+MESSAGE_SEARCH_CONFIG = 'simple'
+# shorter patterns have no trigram to look up, the substring search would scan the whole room
+MESSAGE_SUBSTRING_SEARCH_MIN_LENGTH = 3
+
+# not mapped, so it's never loaded along with messages, only used for filtering
+message_search_vector = Column(
+    'search_vector',
+    TSVECTOR,
+    Computed(f"to_tsvector('{MESSAGE_SEARCH_CONFIG}'::regconfig, content)", persisted=True),
+)
+Message.__table__.append_column(message_search_vector)
+Index('ix_message_search_vector', message_search_vector, postgresql_using='gin')
+# the substring search fallback is backed by a trigram index on content. it needs the pg_trgm extension,
+# so it's only created by the migrations where it's available and not declared here
+MESSAGE_CONTENT_TRGM_INDEX = 'ix_message_content_trgm'
+
+
+@event.listens_for(Message, 'after_insert')
+def touch_room_activity(mapper, connection, target: Message):
+    chat_room = ChatRoom.__table__
+    connection.execute(
+        update(chat_room)
+        .where(chat_room.c.id == target.chat_room_id)
+        .values(
+            last_activity_at=func.greatest(chat_room.c.last_activity_at, target.created_at),
+            message_count=chat_room.c.message_count + 1,
+        )
+    )
+
+
+@event.listens_for(Message, 'after_delete')
+def decrement_room_message_count(mapper, connection, target: Message):
+    chat_room = ChatRoom.__table__
+    connection.execute(
+        update(chat_room)
+        .where(chat_room.c.id == target.chat_room_id)
+        .values(message_count=chat_room.c.message_count - 1)
+    )
+
+
 class RoomRoleEnum(str, enum.Enum):
     ADMIN = 'admin'
     MODERATOR = 'mod'
@@ -136,3 +220,10 @@ class RoomRole(TimestampsMixin, SQLModel, table=True):
         foreign_key='chat_room_invite.id',
         ondelete="SET NULL",
     )
+    # read position, messages after (last_read_at, last_read_message_id) are unread.
+    # no foreign key, so deleting messages doesn't have to look through roles
+    last_read_at: datetime.datetime | None = Field(
+        default=None,
+        sa_type=DateTime(timezone=True),
+    )
+    last_read_message_id: int | None = Field(default=None)
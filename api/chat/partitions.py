@@ -0,0 +1,224 @@
+"""monthly range partitions of the message table by created_at.
+messages outside of monthly partitions end up in the default one.
+
+    python -m chat.partitions list
+    python -m chat.partitions create --months-ahead 3
+    python -m chat.partitions archive --before 2024-01 [--drop]
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import re
+from functools import lru_cache
+
+from sqlalchemy import text
+
+from conf import settings
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = 'message'
+DEFAULT_PARTITION = 'message_default'
+# archived partitions are kept out of the message table, ready to be dumped and dropped
+ARCHIVE_SCHEMA = 'message_archive'
+PARTITION_NAME_RE = re.compile(r'^message_p(\d{4})_(\d{2})$')
+DETACH_LOCK_TIMEOUT = '5s'
+
+
+def is_message_partition(name: str) -> bool:
+    return name == DEFAULT_PARTITION or PARTITION_NAME_RE.match(name) is not None
+
+
+def get_month_start(value: datetime.date) -> datetime.date:
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    year, month_index = divmod(month.month - 1 + months, 12)
+    return datetime.date(month.year + year, month_index + 1, 1)
+
+
+def get_partition_name(month: datetime.date) -> str:
+    return f'message_p{month:%Y_%m}'
+
+
+def get_partition_month(name: str) -> datetime.date | None:
+    match = PARTITION_NAME_RE.match(name)
+    if match is None:
+        return None
+    return datetime.date(int(match[1]), int(match[2]), 1)
+
+
+def get_partitions(connection) -> list[str]:
+    return list(connection.execute(text("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table_name
+        ORDER BY child.relname
+    """), {'table_name': PARTITIONED_TABLE}).scalars())
+
+
+def create_partition(connection, month: datetime.date):
+    # bounds in UTC, not in the session time zone
+    connection.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {get_partition_name(month)} PARTITION OF {PARTITIONED_TABLE} '
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00+00')"
+    ))
+
+
+def create_partitions(connection, months_ahead: int, today: datetime.date | None = None) -> list[str]:
+    """creates missing partitions from the current month on, returns the created ones.
+    a month that already has messages in the default partition is skipped and logged, these have to be moved first.
+    """
+    existing = set(get_partitions(connection))
+    current_month = get_month_start(today or datetime.datetime.now(datetime.timezone.utc).date())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current_month, offset)
+        name = get_partition_name(month)
+        if name in existing:
+            continue
+        try:
+            with connection.begin_nested():
+                create_partition(connection, month)
+        except Exception:
+            logger.exception('Could not create message partition %s.', name)
+            continue
+        created.append(name)
+    return created
+
+
+def get_detached_partitions(connection) -> list[str]:
+    """monthly partitions detached by an interrupted archive, still waiting to be counted and moved.
+    """
+    names = connection.execute(text("""
+        SELECT relname
+        FROM pg_class
+        WHERE relnamespace = current_schema()::regnamespace AND relkind = 'r'
+            AND NOT EXISTS (SELECT FROM pg_inherits WHERE inhrelid = pg_class.oid)
+        ORDER BY relname
+    """)).scalars()
+    return [name for name in names if PARTITION_NAME_RE.match(name)]
+
+
+def archive_partitions(engine, before: datetime.date, drop: bool = False) -> list[str]:
+    """detaches monthly partitions older than `before` and moves them to the archive schema, or drops them.
+    room message counts are decreased by the archived messages.
+    detaching locks the whole message table, so every partition is detached in a short transaction of its own
+    and counted once detached, when nothing can write to it anymore. partitions detached by an interrupted
+    run are picked up by the next one.
+    """
+    with engine.connect() as connection:
+        attached = get_partitions(connection)
+        detached = get_detached_partitions(connection)
+    archived = []
+    for name in sorted(attached + detached):
+        month = get_partition_month(name)
+        if month is None or add_months(month, 1) > before:
+            continue
+        # not concurrently, postgres doesn't allow it with a default partition
+        if name in attached:
+            with engine.begin() as connection:
+                # fails instead of queueing every message query behind the lock
+                connection.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+                connection.execute(text(f'ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name}'))
+        with engine.begin() as connection:
+            connection.execute(text(f"""
+                UPDATE chat_room SET message_count = chat_room.message_count - archived.message_count
+                FROM (
+                    SELECT chat_room_id, count(*) AS message_count FROM {name} GROUP BY chat_room_id
+                ) AS archived
+                WHERE archived.chat_room_id = chat_room.id
+            """))
+            if drop:
+                connection.execute(text(f'DROP TABLE {name}'))
+            else:
+                connection.execute(text(f'CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}'))
+                connection.execute(text(f'ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}'))
+        archived.append(name)
+    return archived
+
+
+class MessagePartitionsMaintainer:
+    """keeps partitions for the coming months created, checked on start and then periodically.
+    """
+
+    def __init__(self, months_ahead: int, check_interval: float):
+        self.months_ahead = months_ahead
+        self.check_interval = check_interval
+        self._task = None
+        self._stopped = None
+
+    async def create_partitions(self):
+        from db import get_async_engine
+
+        async with get_async_engine().begin() as connection:
+            created = await connection.run_sync(create_partitions, self.months_ahead)
+        if created:
+            logger.info('Created message partitions: %s.', ', '.join(created))
+
+    async def _maintain_periodically(self, stopped: asyncio.Event):
+        # not `while True`, a connect timeout can turn the cancellation on stop into an error caught here
+        while not stopped.is_set():
+            try:
+                await self.create_partitions()
+            except Exception:
+                logger.exception('Failed to create message partitions.')
+            try:
+                await asyncio.wait_for(stopped.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        self._stopped = asyncio.Event()
+        self._task = asyncio.create_task(self._maintain_periodically(self._stopped))
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopped.set()
+            self._task.cancel()
+            self._task = None
+
+
+@lru_cache
+def get_partitions_maintainer() -> MessagePartitionsMaintainer:
+    return MessagePartitionsMaintainer(
+        months_ahead=settings.chat_message_partitions_months_ahead,
+        check_interval=settings.chat_message_partitions_check_hours * 3600,
+    )
+
+
+def parse_month(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, '%Y-%m').date()
+
+
+def main():
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='list message partitions')
+    create_parser = subparsers.add_parser('create', help='create partitions for the coming months')
+    create_parser.add_argument('--months-ahead', type=int, default=settings.chat_message_partitions_months_ahead)
+    archive_parser = subparsers.add_parser('archive', help=f'move partitions older than a month to {ARCHIVE_SCHEMA}')
+    archive_parser.add_argument('--before', type=parse_month, required=True, help='YYYY-MM, first month to keep')
+    archive_parser.add_argument('--drop', action='store_true', help='drop archived partitions instead')
+    args = parser.parse_args()
+
+    if args.command == 'archive':
+        partitions = archive_partitions(get_engine(), args.before, drop=args.drop)
+    else:
+        with get_engine().begin() as connection:
+            if args.command == 'list':
+                partitions = get_partitions(connection)
+            else:
+                partitions = create_partitions(connection, args.months_ahead)
+    for name in partitions:
+        print(name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import asyncio
+import datetime
+import logging
+from functools import lru_cache
+
+from sqlmodel import delete, select
+
+from chat.models import ChatRoom, Message
+from conf import settings
+from db import get_async_session
+from utils.utils import get_utc_now
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_chat_room(room_id: int):
+    """deletes room messages in batches to keep transactions short, then the room itself.
+    safe to run again for a room which purge was interrupted, see RoomPurgeSweeper.
+    """
+    batch_size = settings.chat_room_purge_batch_size
+    # message_count is not maintained here, the room goes away with its messages
+    async with get_async_session() as db_session:
+        while True:
+            batch = (
+                select(Message.id)
+                .where(Message.chat_room_id == room_id)
+                .limit(batch_size)
+            )
+            result = await db_session.exec(delete(Message).where(Message.id.in_(batch.scalar_subquery())))
+            await db_session.commit()
+            if result.rowcount < batch_size:
+                break
+        # anything left is removed by the database cascades
+        await db_session.exec(delete(ChatRoom).where(ChatRoom.id == room_id))
+        await db_session.commit()
+
+
+class RoomPurgeSweeper:
+    """purges deleted rooms left behind by an interrupted purge, e.g. when the worker restarted.
+    rooms are only picked up once deleted for a check interval, the deleting worker may still be purging them.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._task = None
+        self._stopped = None
+
+    async def purge_deleted_rooms(self) -> list[int]:
+        deleted_before = get_utc_now() - datetime.timedelta(seconds=self.check_interval)
+        async with get_async_session() as db_session:
+            room_ids = list((await db_session.exec(
+                select(ChatRoom.id).where(ChatRoom.deleted_at < deleted_before)
+            )).all())
+        for room_id in room_ids:
+            await purge_chat_room(room_id)
+        return room_ids
+
+    async def _sweep_periodically(self, stopped: asyncio.Event):
+        # not `while True`, a connect timeout can turn the cancellation on stop into an error caught here
+        while not stopped.is_set():
+            try:
+                await asyncio.wait_for(stopped.wait(), self.check_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                room_ids = await self.purge_deleted_rooms()
+                if room_ids:
+                    logger.info('Purged deleted rooms: %s.', ', '.join(map(str, room_ids)))
+            except Exception:
+                logger.exception('Failed to purge deleted rooms.')
+
+    async def start(self):
+        self._stopped = asyncio.Event()
+        self._task = asyncio.create_task(self._sweep_periodically(self._stopped))
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopped.set()
+            self._task.cancel()
+            self._task = None
+
+
+@lru_cache
+def get_room_purge_sweeper() -> RoomPurgeSweeper:
+    return RoomPurgeSweeper(check_interval=settings.chat_room_purge_sweep_minutes * 60)
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from functools import lru_cache
+
+from sqlalchemy import Integer, column, tuple_, update, values
+from sqlmodel import func
+
+from chat.models import Message, RoomRole
+from conf import settings
+from db import get_async_session
+
+logger = logging.getLogger(__name__)
+
+
+async def write_read_positions(positions: dict[int, int]):
+    """moves read positions of roles to the given message ids in a single statement.
+    """
+    read_positions = values(
+        column('role_id', Integer),
+        column('message_id', Integer),
+        name='read_position',
+    ).data(list(positions.items()))
+    statement = (
+        update(RoomRole)
+        .values(
+            last_read_message_id=Message.id,
+            last_read_at=Message.created_at,
+        )
+        .where(
+            RoomRole.id == read_positions.c.role_id,
+            Message.id == read_positions.c.message_id,
+            # ignores messages from other rooms
+            Message.chat_room_id == RoomRole.chat_room_id,
+            # never moves the position back
+            tuple_(Message.created_at, Message.id) > tuple_(
+                func.coalesce(RoomRole.last_read_at, RoomRole.created_at),
+                func.coalesce(RoomRole.last_read_message_id, 0),
+            ),
+        )
+    )
+    async with get_async_session() as db_session:
+        await db_session.exec(statement)
+        await db_session.commit()
+
+
+class ReadStateBuffer:
+    """coalesces read positions in memory and writes them periodically in a single statement.
+    only the latest position per role is kept, so a burst of receipts costs one row update.
+    """
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending: dict[int, int] = {}
+        self._flush_task = None
+        self._stopped = None
+
+    def mark_read(self, role_id: int, message_id: int):
+        current = self._pending.get(role_id)
+        if current is None or message_id > current:
+            self._pending[role_id] = message_id
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await write_read_positions(pending)
+        except BaseException:
+            # retried with the next flush, unless newer positions were marked meanwhile
+            for role_id, message_id in pending.items():
+                self.mark_read(role_id, message_id)
+            raise
+
+    async def _flush_periodically(self, stopped: asyncio.Event):
+        while True:
+            try:
+                await asyncio.wait_for(stopped.wait(), self.flush_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Failed to flush read positions.')
+
+    async def start(self):
+        self._stopped = asyncio.Event()
+        self._flush_task = asyncio.create_task(self._flush_periodically(self._stopped))
+
+    async def stop(self):
+        if self._flush_task is not None:
+            # a running flush is awaited, not cancelled along with its positions
+            self._stopped.set()
+            await self._flush_task
+            self._flush_task = None
+        await self.flush()
+
+
+@lru_cache
+def get_read_state_buffer() -> ReadStateBuffer:
+    return ReadStateBuffer(flush_interval=settings.chat_read_state_flush_seconds)
@@ -9,7 +9,8 @@ from pydantic import (
 )
 from pydantic_partial import create_partial_model
 
-from chat.models import RoomRoleEnum
+from chat.models import Message, RoomRoleEnum
+from conf import settings
 
 
 class PublicRoomRole(BaseModel):
@@ -71,6 +72,10 @@ class PublicMessage(BaseModel):
     updated_at: Optional[datetime.datetime]
 
 
+# selects public messages as plain rows, without loading the models
+PUBLIC_MESSAGE_COLUMNS = tuple(getattr(Message, name) for name in PublicMessage.model_fields)
+
+
 class CreateMessageBody(BaseModel):
     content: str = Field(min_length=1)
 
@@ -78,9 +83,42 @@ class CreateMessageBody(BaseModel):
 MessageUpdateBody = create_partial_model(CreateMessageBody)
 
 
+class CreateMessagesBatchBody(BaseModel):
+    messages: List[CreateMessageBody] = Field(min_length=1)
+
+    @field_validator('messages')
+    @classmethod
+    def validate_messages(cls, messages):
+        """max length from settings, so it can be changed without redeclaring the schema
+        """
+        if len(messages) > settings.chat_message_batch_max_size:
+            raise ValueError(f'Max {settings.chat_message_batch_max_size} messages per batch.')
+        return messages
+
+
+class MarkReadBody(BaseModel):
+    message_id: int
+
+
 class MessagesList(BaseModel):
-    total: int
-    page: int
+    # total and page are not set with cursor pagination, next and previous are the cursors then
+    total: Optional[int]
+    page: Optional[int]
     page_size: int
     results: List[PublicMessage]
-    next: Optional[int]
+    next: Optional[int | str]
+    previous: Optional[int | str] = None
+
+
+class ChatRoomSummary(PublicChatRoom):
+    last_activity_at: datetime.datetime
+    last_message: Optional[PublicMessage] = None
+    last_read_message_id: Optional[int] = None
+    unread_count: int = 0
+
+
+class ChatRoomsList(BaseModel):
+    page_size: int
+    results: List[ChatRoomSummary]
+    next: Optional[str]
+    previous: Optional[str]
@@ -1,3 +1,6 @@
+import csv
+import io
+import json
 from unittest.mock import ANY
 
 from faker import Faker
@@ -6,6 +9,8 @@ from sqlmodel import delete, select
 from sqlalchemy.orm import selectinload
 
 from auth.tests.factories import UserFactory
+from chat.api import get_rooms_summary
+from chat.export import get_export_limiter
 from chat.models import (
     ChatRoom,
     Message,
@@ -14,6 +19,7 @@ from chat.models import (
     RoomRole,
     RoomRoleEnum,
 )
+from chat.read_state import get_read_state_buffer
 from chat.tests.base import ChatApiTestCase
 from chat.tests.factories import (
     ChatRoomFactory,
@@ -21,6 +27,8 @@ from chat.tests.factories import (
     RoomRoleFactory,
     RoomInviteFactory,
 )
+from db import get_async_session, get_pool_metrics
+from utils.base_tests import override_settings, shared_broadcast
 from utils.test_matchers import AnyOrderedArray
 
 
@@ -71,6 +79,72 @@ class ChatRoomsApiTestCase(ChatApiTestCase):
                 ],
             )
 
+    def test_list_cursor(self):
+        url = self.get_url()
+        # a room user has no access to
+        MessageFactory(chat_room=ChatRoomFactory())
+        quiet_room = RoomRoleFactory(user=self.user).chat_room
+        busy_room = self.chat_room
+        messages = MessageFactory.create_batch(size=3, chat_room=busy_room)
+        own_message = MessageFactory(chat_room=busy_room, created_by=self.user)
+        self.client.force_login(self.user)
+        with self.subTest('should return rooms summary ordered by activity'):
+            response = self.client.get(f'{url}?before=')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(
+                [room['id'] for room in response_data['results']],
+                [busy_room.id, quiet_room.id],
+            )
+            busy_summary, quiet_summary = response_data['results']
+            self.assertEqual(busy_summary['last_message']['id'], own_message.id)
+            self.assertEqual(len(busy_summary['roles']), 1)
+            self.assertIsNone(quiet_summary['last_message'])
+        with self.subTest('should count unread messages of others'):
+            self.assertEqual(busy_summary['unread_count'], 3)
+            self.assertEqual(quiet_summary['unread_count'], 0)
+        self.room_role.last_read_at = messages[1].created_at
+        self.room_role.last_read_message_id = messages[1].id
+        self.db_session.add(self.room_role)
+        self.db_session.commit()
+        with self.subTest('should count messages after last read'):
+            response = self.client.get(f'{url}?before=&page_size=1')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(len(response_data['results']), 1)
+            self.assertEqual(response_data['results'][0]['unread_count'], 1)
+            self.assertEqual(response_data['results'][0]['last_read_message_id'], messages[1].id)
+        with self.subTest('should return next page by cursor'):
+            response = self.client.get(f'{url}?before={response_data["next"]}&page_size=1')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual([room['id'] for room in response_data['results']], [quiet_room.id])
+            self.assertIsNone(response_data['next'])
+        response = self.client.get(f'{url}?before=')
+        newest_cursor = response.json()['previous']
+        with self.subTest('should return nothing if no room had activity'):
+            response = self.client.get(f'{url}?after={newest_cursor}')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(response_data['results'], [])
+            self.assertEqual(response_data['previous'], newest_cursor)
+        new_message = MessageFactory(chat_room=quiet_room)
+        with self.subTest('should return rooms with activity after cursor'):
+            response = self.client.get(f'{url}?after={newest_cursor}')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual([room['id'] for room in response_data['results']], [quiet_room.id])
+            self.assertEqual(response_data['results'][0]['last_message']['id'], new_message.id)
+            self.assertEqual(response_data['results'][0]['unread_count'], 1)
+        with self.subTest('should skip rooms left after the page was loaded'):
+            left_room = ChatRoomFactory()
+
+            async def get_summary():
+                async with get_async_session() as db_session:
+                    return await get_rooms_summary([left_room], self.user, db_session)
+
+            self.assertEqual(self.client.portal.call(get_summary), [])
+
     def test_get(self):
         url = self.get_url(pk=self.chat_room.id)
         with self.subTest('should require auth'):
@@ -164,6 +238,25 @@ class ChatRoomsApiTestCase(ChatApiTestCase):
             roles = self.db_session.exec(select(RoomRole).where(RoomRole.chat_room_id == room_id)).all()
             self.assertEqual(len(roles), 0)
 
+    @override_settings(chat_room_purge_batch_size=2)
+    def test_delete_purge(self):
+        room_id = self.chat_room.id
+        MessageFactory.create_batch(size=5, chat_room=self.chat_room)
+        RoomInviteFactory(chat_room=self.chat_room)
+        RoomRoleFactory(chat_room=self.chat_room)
+        other_room_message = MessageFactory(chat_room=ChatRoomFactory())
+        self.client.force_login(self.user)
+        with self.subTest('should purge room messages in batches'):
+            response = self.client.delete(self.get_url(pk=room_id))
+            self.assertEqual(response.status_code, 204)
+            self.db_session.expire_all()
+            self.assertIsNone(self.db_session.get(ChatRoom, room_id))
+            for model in (Message, RoomRole, RoomInvite):
+                rows = self.db_session.exec(select(model).where(model.chat_room_id == room_id)).all()
+                self.assertEqual(len(rows), 0)
+        with self.subTest('should keep other rooms messages'):
+            self.assertIsNotNone(self.db_session.get(Message, other_room_message.id))
+
     def test_update(self):
         room = RoomRoleFactory(user=self.user).chat_room
         url = self.get_url(pk=room.id)
@@ -293,6 +386,7 @@ class MessagesApiTestCase(ChatApiTestCase):
                     'total': 9,
                     'page': 1,
                     'page_size': ANY,
+                    'previous': None,
                     'next': None,
                     # order is important, but to drop factory order
                     # so we test it later
@@ -312,6 +406,7 @@ class MessagesApiTestCase(ChatApiTestCase):
                     'total': 9,
                     'page': 2,
                     'page_size': 3,
+                    'previous': None,
                     'next': 3,
                     # also tests the order, since second batch is clearly created after first
                     'results': AnyOrderedArray([
@@ -330,6 +425,7 @@ class MessagesApiTestCase(ChatApiTestCase):
                     'total': 3,
                     'page': 1,
                     'page_size': ANY,
+                    'previous': None,
                     'next': None,
                     'results': AnyOrderedArray([
                         serialize_message(message)
@@ -338,6 +434,222 @@ class MessagesApiTestCase(ChatApiTestCase):
                 },
             )
 
+    def test_list_total(self):
+        url = self.get_url()
+        self.client.force_login(self.user)
+        messages = MessageFactory.create_batch(size=4, chat_room=self.chat_room)
+        messages.append(MessageFactory(chat_room=self.chat_room, content='somebody once told me'))
+        with self.subTest('should count messages on insert and delete'):
+            response = self.client.delete(self.get_url(pk=messages[0].id))
+            self.assertEqual(response.status_code, 204)
+            response = self.client.get(f'{url}?page_size=2')
+            response_data = response.json()
+            self.assertEqual(response_data['total'], 4)
+            self.assertEqual(response_data['next'], 2)
+        with self.subTest('should skip total'):
+            response = self.client.get(f'{url}?page=2&page_size=2&total=none')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertIsNone(response_data['total'])
+            self.assertEqual(len(response_data['results']), 2)
+            self.assertIsNone(response_data['next'])
+        with self.subTest('should estimate total of search results'):
+            response = self.client.get(f'{url}?page_size=2&total=estimate&search=somebody once told')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertIsInstance(response_data['total'], int)
+            self.assertEqual([message['id'] for message in response_data['results']], [messages[-1].id])
+            self.assertIsNone(response_data['next'])
+        with self.subTest('should validate total'):
+            response = self.client.get(f'{url}?total=some')
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(chat_message_export_batch_size=2, chat_message_export_max_concurrency=1)
+    def test_export(self):
+        # one export at a time, the following ones only succeed if every export frees its slot
+        get_export_limiter.cache_clear()
+        self.addCleanup(get_export_limiter.cache_clear)
+        url = self.app.url_path_for('chat:export_messages_api', room_id=self.chat_room.id)
+        with self.subTest('should require some room access'):
+            self.client.force_login(UserFactory())
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 404)
+        self.client.force_login(self.user)
+        with self.subTest('should export header only for empty room'):
+            response = self.client.get(f'{url}?format=csv')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(csv.reader(io.StringIO(response.text))), [
+                ['id', 'content', 'type', 'chat_room_id', 'created_by_id', 'created_at', 'updated_at'],
+            ])
+        messages = []
+        for created_at in ('2025-02-12T12:30:00', '2024-12-12T12:30:00', '2025-01-12T12:30:00'):
+            with freeze_time(created_at):
+                messages.append(MessageFactory(chat_room=self.chat_room, content=f'message, "{created_at}"'))
+        MessageFactory(chat_room=ChatRoomFactory())
+        oldest_first = [messages[1], messages[2], messages[0]]
+        with self.subTest('should export room messages as ndjson, oldest first'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['content-type'], 'application/x-ndjson')
+            self.assertEqual(
+                response.headers['content-disposition'],
+                f'attachment; filename="room-{self.chat_room.id}-messages.ndjson"',
+            )
+            exported = [json.loads(line) for line in response.text.splitlines()]
+            self.assertEqual(
+                [(message['id'], message['content']) for message in exported],
+                [(message.id, message.content) for message in oldest_first],
+            )
+        with self.subTest('should export room messages as csv'):
+            response = self.client.get(f'{url}?format=csv')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers['content-type'].startswith('text/csv'))
+            header, *rows = csv.reader(io.StringIO(response.text))
+            self.assertEqual(
+                [(int(row[header.index('id')]), row[header.index('content')]) for row in rows],
+                [(message.id, message.content) for message in oldest_first],
+            )
+        with self.subTest('should export from a pool of its own'):
+            export_metrics = get_pool_metrics('export')
+            checkouts = export_metrics.checkouts
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(export_metrics.checkouts, checkouts + 1)
+        with self.subTest('should reject exports over the limit'):
+            limiter = get_export_limiter()
+            self.client.portal.call(limiter.acquire)
+            self.addCleanup(limiter.release)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 429)
+        with self.subTest('should validate format'):
+            response = self.client.get(f'{url}?format=xml')
+            self.assertEqual(response.status_code, 400)
+
+    def test_list_cursor(self):
+        url = self.get_url()
+        self.client.force_login(self.user)
+        messages = []
+        for created_at in ('2024-12-12T12:30:00', '2025-01-12T12:30:00', '2025-02-12T12:30:00'):
+            with freeze_time(created_at):
+                # same created_at in a batch, ordered by id then
+                messages += MessageFactory.create_batch(
+                    size=2,
+                    chat_room=self.chat_room,
+                )
+        newest_first = [message.id for message in reversed(messages)]
+        with self.subTest('should return first page with empty before'):
+            response = self.client.get(f'{url}?before=&page_size=4')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(response_data['total'], None)
+            self.assertEqual(response_data['page'], None)
+            self.assertEqual(response_data['page_size'], 4)
+            self.assertEqual(
+                [message['id'] for message in response_data['results']],
+                newest_first[:4],
+            )
+            self.assertIsInstance(response_data['next'], str)
+        with self.subTest('should return messages before cursor'):
+            response = self.client.get(f'{url}?before={response_data["next"]}&page_size=4')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(
+                [message['id'] for message in response_data['results']],
+                newest_first[4:],
+            )
+            self.assertIsNone(response_data['next'])
+        with self.subTest('should return messages after cursor, newest first'):
+            response = self.client.get(f'{url}?before=&page_size=5')
+            oldest_cursor = response.json()['next']
+            response = self.client.get(f'{url}?after={oldest_cursor}&page_size=3')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            # messages are created in order, so ids right after the cursor
+            self.assertEqual(
+                [message['id'] for message in response_data['results']],
+                [message.id for message in reversed(messages[2:5])],
+            )
+            response = self.client.get(f'{url}?after={response_data["next"]}&page_size=3')
+            response_data = response.json()
+            self.assertEqual(
+                [message['id'] for message in response_data['results']],
+                [messages[5].id],
+            )
+            self.assertIsNone(response_data['next'])
+        with self.subTest('should return newer messages by previous cursor'):
+            response = self.client.get(f'{url}?before=&page_size=2')
+            response = self.client.get(f'{url}?before={response.json()["next"]}&page_size=2')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual([message['id'] for message in response_data['results']], newest_first[2:4])
+            response = self.client.get(f'{url}?after={response_data["previous"]}&page_size=2')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual([message['id'] for message in response_data['results']], newest_first[:2])
+            self.assertIsInstance(response_data['previous'], str)
+        with self.subTest('should validate cursor'):
+            response = self.client.get(f'{url}?before=somebody')
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get(f'{url}?before=&after=')
+            self.assertEqual(response.status_code, 400)
+        with self.subTest('should keep page pagination by default'):
+            response = self.client.get(f'{url}?page=2&page_size=4')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(response_data['total'], 6)
+            self.assertEqual(response_data['page'], 2)
+            self.assertIsNone(response_data['next'])
+            self.assertEqual(
+                [message['id'] for message in response_data['results']],
+                newest_first[4:],
+            )
+
+    def test_search(self):
+        url = self.get_url()
+        self.client.force_login(self.user)
+        with freeze_time('2024-12-12T12:30:00'):
+            best_match = MessageFactory(chat_room=self.chat_room, content='deploy the deploy script')
+        with freeze_time('2025-01-12T12:30:00'):
+            match = MessageFactory(chat_room=self.chat_room, content='Deploy is done')
+            substring_match = MessageFactory(chat_room=self.chat_room, content='redeployed twice')
+            MessageFactory(chat_room=self.chat_room, content='nothing to see here')
+            wildcard_match = MessageFactory(chat_room=self.chat_room, content='100% done')
+        MessageFactory(
+            chat_room=self.chat_room,
+            content='deploy announced',
+            type=MessageTypeEnum.SYSTEM_ANNOUNCEMENT,
+        )
+        with self.subTest('should rank word matches first, then substring matches'):
+            response = self.client.get(f'{url}?search=deploy')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(response_data['total'], 3)
+            self.assertEqual(
+                [message['id'] for message in response_data['results']],
+                [best_match.id, match.id, substring_match.id],
+            )
+        with self.subTest('should support web search syntax'):
+            response = self.client.get(f'{url}?search=deploy -script')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(
+                [message['id'] for message in response_data['results']],
+                [match.id],
+            )
+        with self.subTest('should match like wildcards literally'):
+            response = self.client.get(f'{url}?search=00%25')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(
+                [message['id'] for message in response_data['results']],
+                [wildcard_match.id],
+            )
+        with self.subTest('should only match words of short terms'):
+            response = self.client.get(f'{url}?search=oy')
+            response_data = response.json()
+            self.assertEqual(response.status_code, 200, response_data)
+            self.assertEqual(response_data['results'], [])
+
     def test_create(self):
         url = self.get_url()
         body = {
@@ -361,6 +673,56 @@ class MessagesApiTestCase(ChatApiTestCase):
             response = self.client.post(url, json=body)
             self.assertEqual(response.status_code, 201)
 
+    @shared_broadcast()
+    @override_settings(chat_message_batch_max_size=3)
+    def test_create_batch(self):
+        url = self.app.url_path_for('chat:create_messages_batch_api', room_id=self.chat_room.id)
+        body = {
+            'messages': [
+                {'content': 'somebody'},
+                {'content': 'once'},
+                {'content': 'told me'},
+            ],
+        }
+        with self.subTest('should require auth'):
+            response = self.client.post(url, json=body)
+            self.assertEqual(response.status_code, 401)
+        self.client.force_login(UserFactory())
+        with self.subTest('should require some room access'):
+            response = self.client.post(url, json=body)
+            self.assertEqual(response.status_code, 404)
+        self.client.force_login(self.user)
+        with self.subTest('should validate batch size'):
+            response = self.client.post(url, json={'messages': []})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post(url, json={'messages': body['messages'] * 2})
+            self.assertEqual(response.status_code, 400)
+        with self.subTest('should validate every message'):
+            response = self.client.post(url, json={'messages': [{'content': 'hey'}, {'content': ''}]})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('messages.1.content', response.json())
+        with self.subTest('should create messages in order with a single insert'):
+            # membership is cached by previous requests
+            with self.assertNumQueries(2):
+                response = self.client.post(url, json=body)
+            response_data = response.json()
+            self.assertEqual(response.status_code, 201, response_data)
+            self.assertEqual(
+                [message['content'] for message in response_data],
+                ['somebody', 'once', 'told me'],
+            )
+            messages = self.db_session.exec(
+                select(Message)
+                .where(Message.chat_room_id == self.chat_room.id)
+                .order_by(Message.id)
+            ).all()
+            self.assertEqual([message.id for message in messages], [message['id'] for message in response_data])
+            for message in messages:
+                self.assertEqual(message.created_by_id, self.user.id)
+                self.assertEqual(message.type, MessageTypeEnum.TEXT)
+            self.db_session.refresh(self.chat_room)
+            self.assertEqual(self.chat_room.last_activity_at, messages[-1].created_at)
+
     def test_update(self):
         body = {
             'content': 'the world is gonna roll me',
@@ -761,3 +1123,42 @@ class ChatInviteApiTestCase(ChatApiTestCase):
                     'id': str(invite.id),
                 },
             )
+
+
+class MarkReadApiTestCase(ChatApiTestCase):
+    def get_url(self, room_id=None):
+        return self.app.url_path_for('chat:mark_read_api', room_id=room_id or self.chat_room.id)
+
+    def flush(self):
+        self.client.portal.call(get_read_state_buffer().flush)
+        self.db_session.refresh(self.room_role)
+
+    def test_mark_read(self):
+        url = self.get_url()
+        messages = MessageFactory.create_batch(size=3, chat_room=self.chat_room)
+        other_room_message = MessageFactory(chat_room=ChatRoomFactory())
+        with self.subTest('should require auth'):
+            response = self.client.post(url, json={'message_id': messages[0].id})
+            self.assertEqual(response.status_code, 401)
+        self.client.force_login(UserFactory())
+        with self.subTest('should require room access'):
+            response = self.client.post(url, json={'message_id': messages[0].id})
+            self.assertEqual(response.status_code, 404)
+        self.client.force_login(self.user)
+        with self.subTest('should write coalesced read position in a single statement'):
+            for message in (messages[0], messages[2], messages[1]):
+                response = self.client.post(url, json={'message_id': message.id})
+                self.assertEqual(response.status_code, 202)
+            self.assertIsNone(self.room_role.last_read_message_id)
+            with self.assertNumQueries(1):
+                self.flush()
+            self.assertEqual(self.room_role.last_read_message_id, messages[2].id)
+            self.assertEqual(self.room_role.last_read_at, messages[2].created_at)
+        with self.subTest('should not move read position back'):
+            self.client.post(url, json={'message_id': messages[0].id})
+            self.flush()
+            self.assertEqual(self.room_role.last_read_message_id, messages[2].id)
+        with self.subTest('should ignore messages from other rooms'):
+            self.client.post(url, json={'message_id': other_room_message.id})
+            self.flush()
+            self.assertEqual(self.room_role.last_read_message_id, messages[2].id)
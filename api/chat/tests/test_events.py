@@ -0,0 +1,146 @@
+from contextlib import ExitStack
+from unittest.mock import patch
+
+from starlette.websockets import WebSocketDisconnect
+
+from auth.tests.factories import UserFactory
+from chat.events import RoomEventTypeEnum, publish_messages_event
+from chat.tests.base import ChatApiTestCase
+from chat.tests.factories import ChatRoomFactory, MessageFactory, RoomRoleFactory
+from utils.broadcast import MemoryBroadcastBackend
+
+
+class RoomEventsWebsocketTestCase(ChatApiTestCase):
+    def get_url(self, room_id=None):
+        room_id = room_id or self.chat_room.id
+        return self.app.url_path_for('chat:room_events_ws', room_id=room_id)
+
+    def get_message_url(self, pk=None):
+        if pk is None:
+            return self.app.url_path_for('chat:create_message_api', room_id=self.chat_room.id)
+        return self.app.url_path_for('chat:update_message_api', message_id=pk)
+
+    def test_access(self):
+        url = self.get_url()
+        with self.subTest('should require auth'):
+            with self.assertRaises(WebSocketDisconnect):
+                with self.client.websocket_connect(url):
+                    pass
+        self.client.force_login(UserFactory())
+        with self.subTest('should require room access'):
+            with self.assertRaises(WebSocketDisconnect):
+                with self.client.websocket_connect(url):
+                    pass
+        with self.subTest('should accept token from query params'):
+            role = RoomRoleFactory(chat_room=self.chat_room)
+            self.client.force_login(role.user)
+            token = self.client.access_token.token
+            self.client.logout()
+            with self.client.websocket_connect(f'{url}?token={token}') as websocket:
+                websocket.close()
+
+    def test_message_events(self):
+        self.client.force_login(self.user)
+        with self.client.websocket_connect(self.get_url()) as websocket:
+            with self.subTest('should push created messages'):
+                response = self.client.post(self.get_message_url(), json={
+                    'content': 'somebody once told me',
+                })
+                self.assertEqual(response.status_code, 201)
+                event = websocket.receive_json()
+                self.assertEqual(event['type'], 'message.created')
+                self.assertEqual(event['chat_room_id'], self.chat_room.id)
+                self.assertDictEqual(event['message'], response.json())
+            message_id = response.json()['id']
+            with self.subTest('should push updated messages'):
+                response = self.client.patch(self.get_message_url(message_id), json={
+                    'content': 'the world is gonna roll me',
+                })
+                self.assertEqual(response.status_code, 200)
+                event = websocket.receive_json()
+                self.assertEqual(event['type'], 'message.updated')
+                self.assertEqual(event['message']['content'], 'the world is gonna roll me')
+            with self.subTest('should push deleted messages'):
+                response = self.client.delete(self.get_message_url(message_id))
+                self.assertEqual(response.status_code, 204)
+                event = websocket.receive_json()
+                self.assertEqual(event['type'], 'message.deleted')
+                self.assertEqual(event['message'], {'id': message_id})
+
+    @patch('chat.events.MESSAGE_IDS_PER_EVENT', 2)
+    def test_batch_events(self):
+        self.client.force_login(self.user)
+        url = self.app.url_path_for('chat:create_messages_batch_api', room_id=self.chat_room.id)
+        with self.client.websocket_connect(self.get_url()) as websocket:
+            with self.subTest('should push every message of a batch'):
+                response = self.client.post(url, json={
+                    'messages': [{'content': 'somebody'}, {'content': 'once'}, {'content': 'told me'}],
+                })
+                self.assertEqual(response.status_code, 201)
+                events = [websocket.receive_json() for _ in range(3)]
+                self.assertEqual([event['type'] for event in events], ['message.created'] * 3)
+                self.assertEqual([event['message'] for event in events], response.json())
+
+    def test_batch_events_queries(self):
+        self.client.force_login(self.user)
+        with ExitStack() as stack:
+            websockets = [stack.enter_context(self.client.websocket_connect(self.get_url())) for _ in range(3)]
+            # every subscriber listens once it received an event
+            response = self.client.post(self.get_message_url(), json={'content': 'somebody'})
+            self.assertEqual(response.status_code, 201)
+            for websocket in websockets:
+                websocket.receive_json()
+            message_ids = [message.id for message in MessageFactory.create_batch(size=3, chat_room=self.chat_room)]
+            with self.subTest('should load batch messages once for all subscribers'):
+                with self.assertNumQueries(1):
+                    self.client.portal.call(
+                        publish_messages_event, RoomEventTypeEnum.MESSAGE_CREATED, self.chat_room.id, message_ids,
+                    )
+                    for websocket in websockets:
+                        events = [websocket.receive_json() for _ in message_ids]
+                        self.assertEqual([event['message']['id'] for event in events], message_ids)
+
+    @patch.object(MemoryBroadcastBackend, 'max_payload_size', 200)
+    def test_large_message_events(self):
+        self.client.force_login(self.user)
+        with self.client.websocket_connect(self.get_url()) as websocket:
+            with self.subTest('should push messages too large for the broadcast'):
+                response = self.client.post(self.get_message_url(), json={
+                    'content': 'somebody once told me ' * 10,
+                })
+                self.assertEqual(response.status_code, 201)
+                event = websocket.receive_json()
+                self.assertEqual(event['type'], 'message.created')
+                self.assertDictEqual(event['message'], response.json())
+
+    def test_role_events(self):
+        role = RoomRoleFactory(chat_room=self.chat_room)
+        user_id = role.user_id
+        self.client.force_login(role.user)
+        url = self.app.url_path_for('chat:delete_room_role_api', role_id=role.id)
+        with self.client.websocket_connect(self.get_url()) as websocket:
+            # make sure other rooms events are not received
+            MessageFactory(chat_room=ChatRoomFactory())
+            with self.subTest('should push exit message and close for removed user'):
+                response = self.client.delete(url)
+                self.assertEqual(response.status_code, 204)
+                event = websocket.receive_json()
+                self.assertEqual(event['type'], 'message.created')
+                self.assertIn('left the chat', event['message']['content'])
+                event = websocket.receive_json()
+                self.assertEqual(event['type'], 'room_role.deleted')
+                self.assertEqual(event['user_id'], user_id)
+                with self.assertRaises(WebSocketDisconnect):
+                    websocket.receive_json()
+
+    def test_room_events(self):
+        self.client.force_login(self.user)
+        url = self.app.url_path_for('chat:delete_room_api', room_id=self.chat_room.id)
+        with self.client.websocket_connect(self.get_url()) as websocket:
+            with self.subTest('should close on room deletion'):
+                response = self.client.delete(url)
+                self.assertEqual(response.status_code, 204)
+                event = websocket.receive_json()
+                self.assertEqual(event['type'], 'room.deleted')
+                with self.assertRaises(WebSocketDisconnect):
+                    websocket.receive_json()
@@ -0,0 +1,79 @@
+import asyncio
+
+from chat.membership import MembershipCache, RoomMembership, get_membership_cache
+from chat.models import RoomRoleEnum
+from chat.tests.base import ChatApiTestCase
+from chat.tests.factories import MessageFactory, RoomRoleFactory
+from utils.base_tests import override_settings, shared_broadcast
+
+
+class MembershipCacheTestCase(ChatApiTestCase):
+    def get_message_url(self):
+        return self.app.url_path_for('chat:create_message_api', room_id=self.chat_room.id)
+
+    def get_role_url(self, pk):
+        return self.app.url_path_for('chat:update_room_role_api', role_id=pk)
+
+    @shared_broadcast()
+    def test_access_checks(self):
+        url = self.get_message_url()
+        body = {'content': 'somebody once told me'}
+        role = RoomRoleFactory(chat_room=self.chat_room, role=RoomRoleEnum.MODERATOR)
+        self.client.force_login(role.user)
+        self.client.post(url, json=body)
+        with self.subTest('should not query membership once cached'):
+            self.assertIsNotNone(get_membership_cache().get(role.user_id, self.chat_room.id))
+            with self.assertNumQueries(2):
+                response = self.client.post(url, json=body)
+            self.assertEqual(response.status_code, 201)
+        self.client.force_login(self.user)
+        with self.subTest('should drop cached membership on role update'):
+            response = self.client.patch(self.get_role_url(role.id), json={'role': RoomRoleEnum.USER})
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(get_membership_cache().get(role.user_id, self.chat_room.id))
+            self.client.force_login(role.user)
+            message = MessageFactory(chat_room=self.chat_room)
+            response = self.client.delete(self.app.url_path_for('chat:delete_message_api', message_id=message.id))
+            self.assertEqual(response.status_code, 404)
+        with self.subTest('should drop cached membership on role delete'):
+            self.client.post(url, json=body)
+            response = self.client.delete(self.get_role_url(role.id))
+            self.assertEqual(response.status_code, 204)
+            response = self.client.post(url, json=body)
+            self.assertEqual(response.status_code, 404)
+
+    def test_memory_broadcast(self):
+        url = self.get_message_url()
+        self.client.force_login(self.user)
+        with self.subTest('should cache memberships with the memory broadcast in a single process'):
+            response = self.client.post(url, json={'content': 'somebody once told me'})
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNotNone(get_membership_cache().get(self.user.id, self.chat_room.id))
+
+    @override_settings(app_processes=2)
+    def test_memory_broadcast_processes(self):
+        url = self.get_message_url()
+        self.client.force_login(self.user)
+        with self.subTest('should not cache memberships the memory broadcast can not invalidate in other processes'):
+            response = self.client.post(url, json={'content': 'somebody once told me'})
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNone(get_membership_cache().get(self.user.id, self.chat_room.id))
+
+    @shared_broadcast()
+    def test_shared_invalidation(self):
+        portal = self.client.portal
+        # a cache of another process, listening to the same broadcast
+        other_cache = MembershipCache(max_size=10, ttl=60)
+        portal.call(other_cache.start)
+        self.addCleanup(portal.call, other_cache.stop)
+        portal.call(asyncio.sleep, 0.01)
+        other_cache.set(RoomMembership(
+            id=self.room_role.id,
+            user_id=self.user.id,
+            chat_room_id=self.chat_room.id,
+            role=RoomRoleEnum.ADMIN,
+        ))
+        with self.subTest('should invalidate memberships in other processes'):
+            portal.call(get_membership_cache().invalidate, [(self.user.id, self.chat_room.id)])
+            portal.call(asyncio.sleep, 0.01)
+            self.assertIsNone(other_cache.get(self.user.id, self.chat_room.id))
@@ -0,0 +1,96 @@
+import datetime
+
+from sqlalchemy import text
+
+from chat.partitions import (
+    ARCHIVE_SCHEMA,
+    DEFAULT_PARTITION,
+    PARTITIONED_TABLE,
+    archive_partitions,
+    create_partitions,
+    get_detached_partitions,
+    get_partitions,
+)
+from chat.tests.base import ChatApiTestCase
+from chat.tests.factories import MessageFactory
+from db import get_engine
+
+# months far in the past, so they don't collide with partitions kept by the app
+PARTITIONS = ('message_p2001_01', 'message_p2001_02')
+
+
+class MessagePartitionsTestCase(ChatApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.engine = get_engine()
+        self.addCleanup(self.drop_partitions)
+
+    def drop_partitions(self):
+        with self.engine.begin() as connection:
+            for name in PARTITIONS:
+                connection.execute(text(f'DROP TABLE IF EXISTS {name}'))
+                connection.execute(text(f'DROP TABLE IF EXISTS {ARCHIVE_SCHEMA}.{name}'))
+
+    def get_message_partition(self, message_id: int) -> str:
+        with self.engine.connect() as connection:
+            return connection.execute(
+                text('SELECT tableoid::regclass::text FROM message WHERE id = :id'),
+                {'id': message_id},
+            ).scalar()
+
+    def get_message_count(self) -> int:
+        with self.engine.connect() as connection:
+            return connection.execute(
+                text('SELECT message_count FROM chat_room WHERE id = :id'),
+                {'id': self.chat_room.id},
+            ).scalar()
+
+    def test_partitions(self):
+        with self.subTest('should create partitions for the coming months'):
+            with self.engine.begin() as connection:
+                created = create_partitions(connection, months_ahead=1, today=datetime.date(2001, 1, 15))
+            self.assertEqual(created, list(PARTITIONS))
+            with self.engine.begin() as connection:
+                self.assertEqual(create_partitions(connection, months_ahead=1, today=datetime.date(2001, 1, 15)), [])
+                self.assertTrue(set(PARTITIONS) <= set(get_partitions(connection)))
+        with self.subTest('should keep messages in their month partition'):
+            message_id = MessageFactory(
+                chat_room_id=self.chat_room.id,
+                created_at=datetime.datetime(2001, 1, 31, 23, 30, tzinfo=datetime.timezone.utc),
+            ).id
+            self.assertEqual(self.get_message_partition(message_id), 'message_p2001_01')
+        with self.subTest('should keep messages without a partition in the default one'):
+            old_message_id = MessageFactory(
+                chat_room_id=self.chat_room.id,
+                created_at=datetime.datetime(2000, 6, 1, tzinfo=datetime.timezone.utc),
+            ).id
+            self.assertEqual(self.get_message_partition(old_message_id), DEFAULT_PARTITION)
+        with self.subTest('should archive partitions before the month'):
+            message_count = self.get_message_count()
+            archived = archive_partitions(self.engine, before=datetime.date(2001, 2, 1))
+            self.assertEqual(archived, ['message_p2001_01'])
+            with self.engine.connect() as connection:
+                self.assertNotIn('message_p2001_01', get_partitions(connection))
+                self.assertEqual(connection.execute(
+                    text(f'SELECT count(*) FROM {ARCHIVE_SCHEMA}.message_p2001_01 WHERE id = :id'),
+                    {'id': message_id},
+                ).scalar(), 1)
+            self.assertIsNone(self.get_message_partition(message_id))
+            self.assertEqual(self.get_message_count(), message_count - 1)
+        with self.subTest('should finish archiving detached partitions'):
+            MessageFactory(
+                chat_room_id=self.chat_room.id,
+                created_at=datetime.datetime(2001, 2, 1, tzinfo=datetime.timezone.utc),
+            )
+            message_count = self.get_message_count()
+            # as left by an archive interrupted after the detach
+            with self.engine.begin() as connection:
+                connection.execute(text(f'ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION message_p2001_02'))
+            with self.engine.connect() as connection:
+                self.assertEqual(get_detached_partitions(connection), ['message_p2001_02'])
+            archived = archive_partitions(self.engine, before=datetime.date(2001, 3, 1), drop=True)
+            self.assertEqual(archived, ['message_p2001_02'])
+            with self.engine.connect() as connection:
+                self.assertFalse(set(PARTITIONS) & set(get_partitions(connection)))
+                self.assertEqual(get_detached_partitions(connection), [])
+            self.assertEqual(self.get_message_count(), message_count - 1)
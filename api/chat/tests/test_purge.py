@@ -0,0 +1,31 @@
+import datetime
+
+from sqlmodel import select
+
+from chat.models import ChatRoom, Message
+from chat.purge import RoomPurgeSweeper
+from chat.tests.base import ChatApiTestCase
+from chat.tests.factories import ChatRoomFactory, MessageFactory
+from utils.utils import get_utc_now
+
+
+class RoomPurgeSweeperTestCase(ChatApiTestCase):
+    def test_purge_deleted_rooms(self):
+        deleted_room = ChatRoomFactory(deleted_at=get_utc_now() - datetime.timedelta(minutes=5))
+        MessageFactory.create_batch(size=2, chat_room=deleted_room)
+        deleted_room_id = deleted_room.id
+        just_deleted_room_id = ChatRoomFactory(deleted_at=get_utc_now()).id
+        room_without_roles_id = ChatRoomFactory().id
+        sweeper = RoomPurgeSweeper(check_interval=60)
+        with self.subTest('should purge rooms deleted before the check interval'):
+            room_ids = self.client.portal.call(sweeper.purge_deleted_rooms)
+            self.assertIn(deleted_room_id, room_ids)
+            self.db_session.expire_all()
+            self.assertIsNone(self.db_session.get(ChatRoom, deleted_room_id))
+            messages = self.db_session.exec(select(Message).where(Message.chat_room_id == deleted_room_id)).all()
+            self.assertEqual(len(messages), 0)
+        with self.subTest('should leave rooms which purge may still be running'):
+            self.assertNotIn(just_deleted_room_id, room_ids)
+            self.assertIsNotNone(self.db_session.get(ChatRoom, just_deleted_room_id))
+        with self.subTest('should not purge rooms that are not deleted'):
+            self.assertIsNotNone(self.db_session.get(ChatRoom, room_without_roles_id))
@@ -0,0 +1,123 @@
+from chat.tests.base import ChatApiTestCase
+from conf import settings
+from db import get_pool_metrics, get_replica_router
+from chat.tests.factories import (
+    ChatRoomFactory,
+    MessageFactory,
+    RoomRoleFactory,
+)
+from utils.base_tests import override_settings, shared_broadcast
+
+# the test database stands in for a replica
+REPLICA_HOST = f'{settings.db_host}:{settings.db_port}'
+
+
+class ChatQueriesTestCase(ChatApiTestCase):
+    """guards endpoints against N+1 queries, the counts shouldn't grow with the data.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # keeps caches in the counted query paths
+        patcher = shared_broadcast()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+        # caches the authenticated user, so it's not counted
+        self.client.get(self.app.url_path_for('chat:rooms_list_api'))
+
+    def add_rooms(self, size):
+        for _ in range(size):
+            room = ChatRoomFactory()
+            RoomRoleFactory(user=self.user, chat_room=room)
+            RoomRoleFactory.create_batch(size=2, chat_room=room)
+            MessageFactory.create_batch(size=2, chat_room=room)
+
+    def test_rooms_list(self):
+        url = self.app.url_path_for('chat:rooms_list_api')
+        with self.subTest('should load rooms with roles'):
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        self.add_rooms(10)
+        with self.subTest('should not query per room'):
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()), 11)
+
+    def test_rooms_summary(self):
+        url = self.app.url_path_for('chat:rooms_list_api')
+        self.add_rooms(10)
+        with self.subTest('should load summary of a page in a single query'):
+            with self.assertNumQueries(3):
+                response = self.client.get(f'{url}?before=')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), 11)
+
+    def test_room_get(self):
+        RoomRoleFactory.create_batch(size=5, chat_room=self.chat_room)
+        url = self.app.url_path_for('chat:get_room_api', room_id=self.chat_room.id)
+        with self.subTest('should load room with roles'):
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['roles']), 6)
+
+    def test_room_update(self):
+        RoomRoleFactory.create_batch(size=5, chat_room=self.chat_room)
+        url = self.app.url_path_for('chat:delete_room_api', room_id=self.chat_room.id)
+        with self.subTest('should not query per role'):
+            with self.assertNumQueries(4):
+                response = self.client.patch(url, json={'name': 'renamed'})
+            self.assertEqual(response.status_code, 200)
+
+    def test_room_create(self):
+        url = self.app.url_path_for('chat:create_room_api')
+        with self.subTest('should not read the room back after insert'):
+            with self.assertNumQueries(2):
+                response = self.client.post(url, json={'name': 'somebody once told me'})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.json()['roles']), 1)
+
+    def test_message_create(self):
+        url = self.app.url_path_for('chat:create_message_api', room_id=self.chat_room.id)
+        with self.subTest('should not read the message back after insert'):
+            with self.assertNumQueries(3):
+                response = self.client.post(url, json={'content': 'somebody once told me'})
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNotNone(response.json()['updated_at'])
+
+    def test_messages_list(self):
+        MessageFactory.create_batch(size=10, chat_room=self.chat_room)
+        url = self.app.url_path_for('chat:list_messages_api', room_id=self.chat_room.id)
+        with self.subTest('should check membership, count and load a page'):
+            with self.assertNumQueries(3):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        with self.subTest('should skip count with cursor and cached membership'):
+            with self.assertNumQueries(1):
+                response = self.client.get(f'{url}?before=')
+            self.assertEqual(response.status_code, 200)
+        with self.subTest('should skip count without total'):
+            with self.assertNumQueries(1):
+                response = self.client.get(f'{url}?total=none')
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(db_replica_hosts=[REPLICA_HOST], db_replica_check_seconds=60)
+    def test_messages_list_replica(self):
+        get_replica_router.cache_clear()
+        self.addCleanup(get_replica_router.cache_clear)
+        # the lag is checked in the background, the app started with the router cached before
+        self.client.portal.call(get_replica_router().check_replicas)
+        MessageFactory.create_batch(size=10, chat_room=self.chat_room)
+        url = self.app.url_path_for('chat:list_messages_api', room_id=self.chat_room.id)
+        self.client.get(url)
+        replica_metrics = get_pool_metrics(f'replica:{REPLICA_HOST}')
+        checkouts = replica_metrics.checkouts
+        with self.subTest('should read messages from replica'):
+            with self.assertNumQueries(0):
+                response = self.client.get(f'{url}?before=')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), 10)
+            self.assertEqual(replica_metrics.checkouts, checkouts + 1)
@@ -0,0 +1,43 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from chat.read_state import ReadStateBuffer
+
+
+class ReadStateBufferTestCase(IsolatedAsyncioTestCase):
+    async def test_failed_flush(self):
+        buffer = ReadStateBuffer(flush_interval=60)
+        buffer.mark_read(1, 10)
+        buffer.mark_read(2, 20)
+
+        async def fail(positions):
+            # marked while the write is running
+            buffer.mark_read(1, 11)
+            buffer.mark_read(2, 19)
+            raise OSError('connection lost')
+
+        with patch('chat.read_state.write_read_positions', fail):
+            with self.assertRaises(OSError):
+                await buffer.flush()
+        with self.subTest('should keep positions of a failed flush unless newer are marked'):
+            self.assertEqual(buffer._pending, {1: 11, 2: 20})
+
+    async def test_stop(self):
+        buffer = ReadStateBuffer(flush_interval=0.01)
+        written = []
+        writing = asyncio.Event()
+
+        async def write_slowly(positions):
+            writing.set()
+            await asyncio.sleep(0.05)
+            written.append(positions)
+
+        with patch('chat.read_state.write_read_positions', write_slowly):
+            await buffer.start()
+            buffer.mark_read(1, 10)
+            await asyncio.wait_for(writing.wait(), timeout=5)
+            buffer.mark_read(2, 20)
+            await buffer.stop()
+        with self.subTest('should finish a running flush, then flush the rest'):
+            self.assertEqual(written, [{1: 10}, {2: 20}])
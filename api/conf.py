@@ -13,9 +13,18 @@ def get_settings() -> Settings:
 
 
 class LazySettings:
-    def __getattribute__(self, name):
-        settings_module = get_settings()
-        return getattr(settings_module, name)
+    """resolves the settings of the process on first access and keeps the values on the proxy,
+    so hot paths get a plain attribute lookup. call reload() after changing the settings object.
+    """
 
+    def __getattr__(self, name):
+        # only reached for values that are not cached yet
+        value = getattr(get_settings(), name)
+        self.__dict__[name] = value
+        return value
 
-settings: Settings = LazySettings()
\ No newline at end of file
+    def reload(self):
+        self.__dict__.clear()
+
+
+settings: Settings = LazySettings()
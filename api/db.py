@@ -1,26 +1,257 @@
+import asyncio
+import logging
+import time
 from contextlib import contextmanager
 from functools import lru_cache
 from typing import Annotated
 
 from fastapi import Depends
+from sqlalchemy import event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from conf import settings
 
+logger = logging.getLogger(__name__)
 
-def get_db_connection_dsn():
-    return f'{settings.db_engine}://{settings.db_user}:{settings.db_password}@{settings.db_host}:{settings.db_port}/{settings.db_name}'
+
+def get_db_connection_dsn(db_engine=None, db_host=None):
+    db_engine = db_engine or settings.db_engine
+    db_host = db_host or f'{settings.db_host}:{settings.db_port}'
+    return f'{db_engine}://{settings.db_user}:{settings.db_password}@{db_host}/{settings.db_name}'
+
+
+def get_async_db_connection_dsn(db_host=None):
+    return get_db_connection_dsn(settings.db_async_engine, db_host)
+
+
+class PoolMetrics:
+    """connection pool counters of an engine, to tell pool starvation from slow queries.
+    """
+    gauges = ('size', 'checkedin', 'checkedout', 'overflow')
+
+    def __init__(self):
+        self.engine = None
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe_wait(self, seconds: float):
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def listen(self, engine):
+        self.engine = engine
+
+        @event.listens_for(engine, 'checkout')
+        def on_checkout(*args):
+            self.checkouts += 1
+
+        @event.listens_for(engine, 'connect')
+        def on_connect(*args):
+            self.connects += 1
+
+        @event.listens_for(engine, 'invalidate')
+        def on_invalidate(*args):
+            self.invalidations += 1
+
+    def as_dict(self) -> dict:
+        data = {
+            'checkouts': self.checkouts,
+            'connects': self.connects,
+            'invalidations': self.invalidations,
+            'timeouts': self.timeouts,
+            'wait_seconds_total': self.wait_seconds_total,
+            'wait_seconds_max': self.wait_seconds_max,
+        }
+        # the pool is replaced on dispose, the engine keeps the current one
+        pool = self.engine.pool if self.engine is not None else None
+        for gauge in self.gauges:
+            method = getattr(pool, gauge, None)
+            if method is not None:
+                data[gauge] = method()
+        return data
+
+
+@lru_cache
+def get_pool_metrics(name: str) -> PoolMetrics:
+    return PoolMetrics()
+
+
+def get_measured_pool_class(pool_class, metrics: PoolMetrics):
+    """pool subclass timing connection checkouts, including the wait for a free connection.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return pool_class._do_get(self)
+        except PoolTimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            metrics.observe_wait(time.perf_counter() - start)
+
+    return type(f'Measured{pool_class.__name__}', (pool_class,), {'_do_get': _do_get})
+
+
+def get_engine_kwargs(pool_class, metrics: PoolMetrics, pool_size=None, max_overflow=None) -> dict:
+    kwargs = {
+        'poolclass': get_measured_pool_class(pool_class, metrics),
+        'pool_pre_ping': settings.db_pool_pre_ping,
+    }
+    # sizing only applies to queue pools, the others reject these arguments
+    if issubclass(pool_class, QueuePool):
+        kwargs.update(
+            pool_size=settings.db_pool_size if pool_size is None else pool_size,
+            max_overflow=settings.db_pool_max_overflow if max_overflow is None else max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds,
+            pool_recycle=settings.db_pool_recycle_seconds,
+        )
+    return kwargs
+
+
+def create_measured_engine(create, dsn, name, pool_class, pool_size=None, max_overflow=None, **kwargs):
+    metrics = get_pool_metrics(name)
+    engine = create(dsn, **get_engine_kwargs(pool_class, metrics, pool_size, max_overflow), **kwargs)
+    metrics.listen(engine.sync_engine if hasattr(engine, 'sync_engine') else engine)
+    return engine
 
 
 @lru_cache
 def get_engine():
-    engine = create_engine(
+    connect_args = {'connect_timeout': settings.db_connect_timeout_seconds}
+    if settings.db_statement_timeout_ms:
+        connect_args['options'] = f'-c statement_timeout={settings.db_statement_timeout_ms}'
+    engine = create_measured_engine(
+        create_engine,
         get_db_connection_dsn(),
-        poolclass=settings.db_pool_class,
+        name='sync',
+        pool_class=settings.db_pool_class or QueuePool,
+        connect_args=connect_args,
+    )
+    return engine
+
+
+def get_async_connect_args() -> dict:
+    connect_args = {'timeout': settings.db_connect_timeout_seconds}
+    if settings.db_statement_timeout_ms:
+        connect_args['server_settings'] = {'statement_timeout': str(settings.db_statement_timeout_ms)}
+    return connect_args
+
+
+@lru_cache
+def get_async_engine():
+    engine = create_measured_engine(
+        create_async_engine,
+        get_async_db_connection_dsn(),
+        name='async',
+        pool_class=settings.db_async_pool_class or AsyncAdaptedQueuePool,
+        connect_args=get_async_connect_args(),
     )
     return engine
 
 
+class ReplicaRouter:
+    """picks a replica for read only queries, round robin.
+    replica lag is checked in the background, requests only read the last results.
+    replicas lagging more than max_lag seconds or not reachable are skipped until the next check,
+    the primary is used when none is usable or before the first check.
+    """
+    # caught up replicas have nothing left to replay, however old their last transaction is.
+    # the primary has neither, which counts as no lag
+    lag_query = text("""
+        SELECT CASE
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """)
+
+    def __init__(self, engines: list, max_lag: float, check_interval: float):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._usable = {}
+        self._next = 0
+        self._task = None
+        self._stopped = None
+
+    async def get_lag(self, engine) -> float:
+        async with engine.connect() as connection:
+            return (await connection.execute(self.lag_query)).scalar()
+
+    async def check_replica(self, engine):
+        try:
+            lag = await self.get_lag(engine)
+            is_usable = lag <= self.max_lag
+            if not is_usable:
+                logger.warning('Replica %s is %.1f seconds behind.', engine.url.host, lag)
+        except Exception:
+            logger.exception('Could not check replica %s.', engine.url.host)
+            is_usable = False
+        self._usable[engine] = is_usable
+
+    async def check_replicas(self):
+        await asyncio.gather(*(self.check_replica(engine) for engine in self.engines))
+
+    def is_usable(self, engine) -> bool:
+        return self._usable.get(engine, False)
+
+    def get_read_engine(self):
+        for offset in range(len(self.engines)):
+            index = (self._next + offset) % len(self.engines)
+            if self.is_usable(self.engines[index]):
+                self._next = index + 1
+                return self.engines[index]
+        return get_async_engine()
+
+    async def _check_periodically(self, stopped: asyncio.Event):
+        # not `while True`, a connect timeout can turn the cancellation on stop into an error caught here
+        while not stopped.is_set():
+            await self.check_replicas()
+            try:
+                await asyncio.wait_for(stopped.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        if not self.engines:
+            return
+        self._stopped = asyncio.Event()
+        self._task = asyncio.create_task(self._check_periodically(self._stopped))
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopped.set()
+            self._task.cancel()
+            self._task = None
+
+
+@lru_cache
+def get_replica_router() -> ReplicaRouter:
+    engines = [
+        create_measured_engine(
+            create_async_engine,
+            get_async_db_connection_dsn(db_host),
+            name=f'replica:{db_host}',
+            pool_class=settings.db_async_pool_class or AsyncAdaptedQueuePool,
+            connect_args=get_async_connect_args(),
+        )
+        for db_host in settings.db_replica_hosts
+    ]
+    return ReplicaRouter(
+        engines,
+        max_lag=settings.db_replica_max_lag_seconds,
+        check_interval=settings.db_replica_check_seconds,
+    )
+
+
 @lru_cache
 def session_factory():
     return Session(get_engine())
@@ -32,9 +263,22 @@ def get_session():
         yield session
 
 
-def get_dep_session():
-    with Session(get_engine()) as session:
+def get_async_session():
+    # objects are kept loaded after commit, refreshing them would need an await
+    return AsyncSession(get_async_engine(), expire_on_commit=False)
+
+
+async def get_dep_session():
+    async with get_async_session() as session:
+        yield session
+
+
+async def get_dep_read_session():
+    # for read only requests, anything written through it would go to the replica
+    engine = get_replica_router().get_read_engine()
+    async with AsyncSession(engine, expire_on_commit=False) as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_dep_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_dep_session)]
+ReadSessionDep = Annotated[AsyncSession, Depends(get_dep_read_session)]
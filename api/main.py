@@ -1,17 +1,57 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
-from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 
+from auth.authorization import get_user_cache
 from auth.middleware import SessionUserMiddleware
 from auth.router import auth_router
 from chat.api import chat_router
+from chat.membership import get_membership_cache
+from chat.partitions import get_partitions_maintainer
+from chat.purge import get_room_purge_sweeper
+from chat.read_state import get_read_state_buffer
 from conf import settings
+from db import get_replica_router
+from monitoring.router import monitoring_router
+from utils.broadcast import get_broadcast
 from utils.serialization import serialize_errors
 from utils.exceptions import ValidationError
+from utils.response import JsonResponse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    broadcast = get_broadcast()
+    replica_router = get_replica_router()
+    user_cache = get_user_cache()
+    membership_cache = get_membership_cache()
+    read_state_buffer = get_read_state_buffer()
+    partitions_maintainer = get_partitions_maintainer()
+    room_purge_sweeper = get_room_purge_sweeper()
+    await broadcast.connect()
+    await replica_router.start()
+    await user_cache.start()
+    await membership_cache.start()
+    await read_state_buffer.start()
+    await partitions_maintainer.start()
+    await room_purge_sweeper.start()
+    try:
+        yield
+    finally:
+        await room_purge_sweeper.stop()
+        await partitions_maintainer.stop()
+        await read_state_buffer.stop()
+        await membership_cache.stop()
+        await user_cache.stop()
+        await replica_router.stop()
+        await broadcast.disconnect()
+
 
 app = FastAPI(
     debug=settings.debug,
+    lifespan=lifespan,
+    default_response_class=JsonResponse,
 )
 
 app.add_middleware(SessionUserMiddleware)
@@ -21,9 +61,9 @@ async def validation_exception_handler(
     request: Request,
     error: RequestValidationError,
 ):
-    return JSONResponse(
+    return JsonResponse(
         status_code=400,
-        content=jsonable_encoder(serialize_errors(error)),
+        content=serialize_errors(error),
     )
 
 
@@ -33,11 +73,12 @@ async def validation_error_handler(
     request: Request,
     error: ValidationError,
 ):
-    return JSONResponse(
+    return JsonResponse(
         status_code=400,
-        content=jsonable_encoder(error.errors),
+        content=error.errors,
     )
 
 
 app.include_router(auth_router, prefix='/api/auth')
 app.include_router(chat_router, prefix='/api/chat')
+app.include_router(monitoring_router, prefix='/api/metrics')
@@ -9,11 +9,13 @@ from sqlmodel import SQLModel
 from db import get_db_connection_dsn
 from auth.models import User  # noqa: F401
 from chat.models import (
+    MESSAGE_CONTENT_TRGM_INDEX,
     ChatRoom,  # noqa: F401
     Message,  # noqa: F401
     RoomInvite,  # noqa: F401
     RoomRole,  # noqa: F401
 )
+from chat.partitions import is_message_partition
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -32,6 +34,17 @@ target_metadata = SQLModel.metadata
 
 config.set_main_option('sqlalchemy.url', get_db_connection_dsn())
 
+
+def include_name(name, type_, parent_names):
+    # partitions are created by chat.partitions, not declared by the models
+    if type_ == 'table':
+        return not is_message_partition(name)
+    # depends on pg_trgm being available, see chat.models
+    if type_ == 'index':
+        return name != MESSAGE_CONTENT_TRGM_INDEX
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -82,6 +95,7 @@ def run_migrations_online() -> None:
             target_metadata=target_metadata,
             compare_type=True,
             compare_server_default=True,
+            include_name=include_name,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,37 @@
+"""add room activity and read state
+
+Revision ID: 54b07d1969c1
+Revises: b7f6dabb04a8
+Create Date: 2026-10-18 18:59:17.869688
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '54b07d1969c1'
+down_revision: Union[str, Sequence[str], None] = 'b7f6dabb04a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_room', sa.Column('last_activity_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.execute("""
+        UPDATE chat_room SET last_activity_at = coalesce(
+            (SELECT max(message.created_at) FROM message WHERE message.chat_room_id = chat_room.id),
+            chat_room.created_at
+        )
+    """)
+    op.add_column('roomrole', sa.Column('last_read_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('roomrole', 'last_read_at')
+    op.drop_column('chat_room', 'last_activity_at')
@@ -0,0 +1,107 @@
+"""partition message by month
+
+the table is rebuilt and messages are copied over in a single transaction,
+large tables need a maintenance window.
+
+Revision ID: 625e36f48f99
+Revises: fbf9fd0714eb
+Create Date: 2026-10-18 19:24:34.293198
+
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '625e36f48f99'
+down_revision: Union[str, Sequence[str], None] = 'fbf9fd0714eb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PARTITIONS_MONTHS_AHEAD = 3
+COPIED_COLUMNS = 'id, content, type, created_by_id, created_at, updated_at, chat_room_id'
+
+
+def get_message_columns() -> list[sa.Column]:
+    return [
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('message_id_seq'::regclass)"), nullable=False),
+        sa.Column('content', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('type', postgresql.ENUM('TEXT', 'SYSTEM_ANNOUNCEMENT', name='messagetypeenum', create_type=False), nullable=True),
+        sa.Column('created_by_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('chat_room_id', sa.Integer(), nullable=False),
+        sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("to_tsvector('simple'::regconfig, content)", persisted=True), nullable=True),
+        sa.ForeignKeyConstraint(['chat_room_id'], ['chat_room.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['created_by_id'], ['auth_users.id'], ondelete='SET NULL'),
+    ]
+
+
+def create_message_indexes():
+    op.create_index('ix_message_created_by_id', 'message', ['created_by_id'], unique=False)
+    op.create_index('ix_message_chat_room_id_created_at_id', 'message', ['chat_room_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_message_search_vector', 'message', ['search_vector'], unique=False, postgresql_using='gin')
+    trgm_installed = op.get_bind().execute(
+        sa.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    ).scalar() is not None
+    if trgm_installed:
+        op.create_index('ix_message_content_trgm', 'message', ['content'], unique=False, postgresql_using='gin', postgresql_ops={'content': 'gin_trgm_ops'})
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    year, month_index = divmod(month.month - 1 + months, 12)
+    return datetime.date(month.year + year, month_index + 1, 1)
+
+
+def create_partitions():
+    """monthly partitions for the copied messages and the coming months, anything else goes to the default one.
+    """
+    oldest = op.get_bind().execute(sa.text('SELECT min(created_at) FROM message_old')).scalar()
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    month = datetime.date((oldest or today).year, (oldest or today).month, 1)
+    last_month = add_months(datetime.date(today.year, today.month, 1), PARTITIONS_MONTHS_AHEAD)
+    while month <= last_month:
+        op.execute(
+            f'CREATE TABLE message_p{month:%Y_%m} PARTITION OF message '
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00+00')"
+        )
+        month = add_months(month, 1)
+    op.execute('CREATE TABLE message_default PARTITION OF message DEFAULT')
+
+
+def rebuild_message_table(partitioned: bool):
+    op.rename_table('message', 'message_old')
+    op.execute('ALTER INDEX message_pkey RENAME TO message_old_pkey')
+    if partitioned:
+        op.create_table(
+            'message',
+            *get_message_columns(),
+            sa.PrimaryKeyConstraint('id', 'created_at'),
+            postgresql_partition_by='RANGE (created_at)',
+        )
+        create_partitions()
+    else:
+        op.create_table('message', *get_message_columns(), sa.PrimaryKeyConstraint('id'))
+    # the sequence would be dropped with the old table otherwise
+    op.execute('ALTER SEQUENCE message_id_seq OWNED BY message.id')
+    op.execute(f'INSERT INTO message ({COPIED_COLUMNS}) SELECT {COPIED_COLUMNS} FROM message_old')
+    op.drop_table('message_old')
+    # built after the copy, it's faster than maintaining them row by row
+    create_message_indexes()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    rebuild_message_table(partitioned=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # archived partitions are left in their schema
+    rebuild_message_table(partitioned=False)
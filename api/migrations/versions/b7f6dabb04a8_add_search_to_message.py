@@ -0,0 +1,68 @@
+"""add search to message
+
+Revision ID: b7f6dabb04a8
+Revises: e6513b3e2ad5
+Create Date: 2026-10-18 18:54:41.730369
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7f6dabb04a8'
+down_revision: Union[str, Sequence[str], None] = 'e6513b3e2ad5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+def is_trgm_available() -> bool:
+    # pg_trgm ships with contrib, which may be missing on minimal installations
+    return op.get_bind().execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).scalar() is not None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    trgm_available = is_trgm_available()
+    if trgm_available:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    else:
+        logger.warning('pg_trgm is not available, substring message search will not be indexed.')
+    # rewrites the table to fill the stored column
+    op.add_column('message', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("to_tsvector('simple'::regconfig, content)", persisted=True), nullable=True))
+    with op.get_context().autocommit_block():
+        if trgm_available:
+            op.create_index(
+                'ix_message_content_trgm',
+                'message',
+                ['content'],
+                unique=False,
+                postgresql_using='gin',
+                postgresql_ops={'content': 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+            )
+        op.create_index(
+            'ix_message_search_vector',
+            'message',
+            ['search_vector'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_message_search_vector', table_name='message', postgresql_concurrently=True)
+        op.drop_index('ix_message_content_trgm', table_name='message', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('message', 'search_vector')
@@ -0,0 +1,42 @@
+"""add room timeline index to message
+
+Revision ID: e6513b3e2ad5
+Revises: 5c5cd320812c
+Create Date: 2026-10-18 18:51:28.826577
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6513b3e2ad5'
+down_revision: Union[str, Sequence[str], None] = '5c5cd320812c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # built concurrently to not lock writes on big message tables
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_message_chat_room_id_created_at_id',
+            'message',
+            ['chat_room_id', sa.literal_column('created_at DESC'), sa.literal_column('id DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_message_chat_room_id_created_at_id',
+            table_name='message',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,14 @@
+from auth.authorizers import require_authentication, require_superuser
+from conf import settings
+from db import get_pool_metrics
+from utils.base_view import BaseApi
+
+
+class DatabasePoolMetricsApi(BaseApi):
+    authorizers = [require_authentication, require_superuser]
+
+    async def get(self, request):
+        return {
+            name: get_pool_metrics(name).as_dict()
+            for name in ('sync', 'async', 'export', *(f'replica:{host}' for host in settings.db_replica_hosts))
+        }
@@ -0,0 +1,8 @@
+from fastapi import APIRouter
+
+from monitoring.api import DatabasePoolMetricsApi
+
+
+monitoring_router = APIRouter()
+
+monitoring_router.add_api_route('/db', DatabasePoolMetricsApi.as_view(), methods=['GET'], name='monitoring:db_pool_metrics_api')
@@ -0,0 +1,33 @@
+from unittest.mock import ANY
+
+from auth.tests.factories import UserFactory
+from utils.base_tests import ApiTestCase
+
+
+class DatabasePoolMetricsApiTestCase(ApiTestCase):
+    @property
+    def url(self):
+        return self.app.url_path_for('monitoring:db_pool_metrics_api')
+
+    def test_get(self):
+        with self.subTest('should require authentication'):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 401)
+        self.client.force_login(self.user)
+        with self.subTest('should require superuser'):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 403)
+        self.client.force_login(UserFactory(is_superuser=True))
+        with self.subTest('should return pool counters'):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            response_data = response.json()
+            self.assertEqual(response_data['async'], {
+                'checkouts': ANY,
+                'connects': ANY,
+                'invalidations': ANY,
+                'timeouts': ANY,
+                'wait_seconds_total': ANY,
+                'wait_seconds_max': ANY,
+            })
+            self.assertGreater(response_data['async']['checkouts'], 0)
@@ -13,17 +13,59 @@ class Settings(BaseSettings):
 
     access_token_hash_algorithm: str = 'HS256'
     access_token_expire_minutes: int = 60
+    auth_user_cache_ttl_seconds: int = 30
+    auth_user_cache_max_size: int = 10000
+    # authenticates by the user claims of the token, without a user lookup.
+    # deactivation and other user changes apply once the token is refreshed
+    auth_trust_token_claims: bool = False
+    auth_password_hash_rounds: int = 12
+    auth_password_hash_workers: int = 4
 
     chat_invite_valid_hours: int = 24
     max_invite_reuse_before_expiry_min: int = 10
+    chat_room_purge_batch_size: int = 10000
+    # how often deleted rooms with an interrupted purge are looked for
+    chat_room_purge_sweep_minutes: float = 10
+    chat_read_state_flush_seconds: float = 5
+    chat_message_batch_max_size: int = 1000
+    chat_message_export_batch_size: int = 1000
+    # exports keep a database connection for the whole download, more concurrent ones are rejected
+    chat_message_export_max_concurrency: int = 4
+    chat_message_partitions_months_ahead: int = 3
+    chat_message_partitions_check_hours: float = 24
+    chat_membership_cache_ttl_seconds: int = 30
+    chat_membership_cache_max_size: int = 100000
 
     db_engine: str = 'postgresql'
+    db_async_engine: str = 'postgresql+asyncpg'
     db_host: str = 'localhost'
     db_port: str = '5432'
     db_user: str = 'add db user to .env'
     db_password: str = 'add db password to .env'
     db_name: str = 'add db name to .env'
     db_pool_class: None | Type[Pool] = None
+    db_async_pool_class: None | Type[Pool] = None
+    # per engine and worker, keep workers * (size + overflow) under max_connections
+    db_pool_size: int = 5
+    db_pool_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 30
+    # -1 keeps connections open indefinitely
+    db_pool_recycle_seconds: int = -1
+    db_pool_pre_ping: bool = False
+    db_connect_timeout_seconds: int = 10
+    # 0 disables the timeout
+    db_statement_timeout_ms: int = 0
+    # "host:port" of streaming replicas with the same database and credentials, used by read only endpoints
+    db_replica_hosts: list[str] = []
+    db_replica_max_lag_seconds: float = 5
+    db_replica_check_seconds: float = 1
+
+    # memory: single process only, postgres: LISTEN/NOTIFY across workers and hosts.
+    # user and membership caches rely on it for invalidation, they are only used with
+    # the postgres backend or with a single app process
+    broadcast_backend: str = 'memory'
+    # app workers and hosts serving the same database, set it when running more than one with the memory backend
+    app_processes: int = 1
 
     class Config:
         env_file = '.env'
@@ -2,6 +2,7 @@
 import os
 import logging
 import unittest
+import freezegun
 from sqlalchemy.exc import ProgrammingError, OperationalError
 from db import get_db_connection_dsn
 from sqlalchemy_utils.functions import create_database, drop_database
@@ -9,6 +10,8 @@ from sqlalchemy_utils.functions import create_database, drop_database
 logger = logging.getLogger(__file__)
 
 os.environ['FASTAPI_SETTINGS_MODULE'] = 'test_settings'
+# app event loops keep the real clock, otherwise frozen time expires their timeouts or never wakes them
+freezegun.configure(extend_ignore_list=['asyncio', 'anyio'])
 
 from conf import get_settings  # noqa: E402
 
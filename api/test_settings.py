@@ -1,11 +1,16 @@
 from typing import Type
 from sqlmodel import StaticPool
+from sqlalchemy.pool import NullPool
 from settings import Settings as BaseSettings
 from sqlalchemy import Pool
 
 
 class Settings(BaseSettings):
     db_pool_class: Type[Pool] | None = StaticPool
+    # every test client runs its own event loop, asyncpg connections can't be shared between them
+    db_async_pool_class: Type[Pool] | None = NullPool
+    # the lowest cost above bcrypt's minimum, leaves room to test rehashing
+    auth_password_hash_rounds: int = 5
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1,15 +1,20 @@
+from contextlib import contextmanager
 from functools import wraps
 from copy import deepcopy
 from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
 
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from starlette.types import ASGIApp
 
 from auth.tests.factories import UserFactory
 from auth.models import User
 from auth.authorization import generate_user_access_token
-from conf import get_settings
+from conf import get_settings, settings as lazy_settings
+from db import get_async_engine
 from main import app
+from utils.broadcast import MemoryBroadcastBackend
 
 
 class BaseTestCase(IsolatedAsyncioTestCase):
@@ -39,6 +44,30 @@ class ApiTestCase(BaseTestCase):
         super().setUp()
         self.user = UserFactory()
         self.client = ApiTestClient(app)
+        # runs the app lifespan and keeps all requests on a single event loop
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+
+    @contextmanager
+    def assertNumQueries(self, num: int):
+        """counts statements the app sends to the database within the block.
+        """
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = get_async_engine().sync_engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        self.assertEqual(
+            len(statements),
+            num,
+            '{} queries executed, {} expected:\n{}'.format(len(statements), num, '\n'.join(statements)),
+        )
 
 
 def override_settings(**overrides):
@@ -50,9 +79,19 @@ def override_settings(**overrides):
             try:
                 for k, v in overrides.items():
                     setattr(settings, k, v)
+                lazy_settings.reload()
                 return func(*args, **kwargs)
             finally:
                 for k, v in original.items():
                     setattr(settings, k, v)
+                lazy_settings.reload()
         return wrapper
     return decorator
+
+
+def shared_broadcast():
+    """the in-process broadcast stands in for a shared one, caches invalidated through it stay enabled
+    whatever app_processes is set to.
+    usable as a decorator or a patcher.
+    """
+    return patch.object(MemoryBroadcastBackend, 'is_shared', True)
@@ -1,8 +1,8 @@
 from typing import Protocol
 from fastapi import HTTPException, status
 from fastapi import Request as BaseRequest
-from sqlmodel import Session
-from db import SessionDep
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import ReadSessionDep, SessionDep
 from utils.request import Request
 
 
@@ -13,12 +13,15 @@ class Authorizer(Protocol):
 
 class BaseApi:
     authorizers: list[Authorizer] | None = None
-    db_session: Session
+    db_session: AsyncSession
+    # views that never write can be served by a replica
+    read_only: bool = False
 
     @classmethod
     def as_view(cls):
+        session_dep = ReadSessionDep if cls.read_only else SessionDep
 
-        async def handle_request(request: BaseRequest, db_session: SessionDep):
+        async def handle_request(request: BaseRequest, db_session: session_dep):
             view = cls()
             wrapped_request = Request(
                 scope=request.scope,
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, Protocol
+
+from conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Event:
+    channel: str
+    message: str
+
+
+class BroadcastBackend(Protocol):
+    # largest message the backend can deliver in bytes, None when unlimited
+    max_payload_size: int | None
+    # whether events reach other processes
+    is_shared: bool
+
+    async def connect(self) -> None: ...
+
+    async def disconnect(self) -> None: ...
+
+    async def subscribe(self, channel: str) -> None: ...
+
+    async def unsubscribe(self, channel: str) -> None: ...
+
+    async def publish(self, channel: str, message: str) -> None: ...
+
+    async def next_published(self) -> Event: ...
+
+
+class MemoryBroadcastBackend:
+    """delivers events within the current process only.
+    """
+    max_payload_size = None
+    is_shared = False
+
+    async def connect(self):
+        self._published = asyncio.Queue()
+        self._channels = set()
+
+    async def disconnect(self):
+        self._channels.clear()
+
+    async def subscribe(self, channel):
+        self._channels.add(channel)
+
+    async def unsubscribe(self, channel):
+        self._channels.discard(channel)
+
+    async def publish(self, channel, message):
+        if channel in self._channels:
+            self._published.put_nowait(Event(channel=channel, message=message))
+
+    async def next_published(self):
+        return await self._published.get()
+
+
+class PostgresBroadcastBackend:
+    """delivers events to every process connected to the database using LISTEN/NOTIFY.
+    a lost connection is reopened in the background and its channels listened to again,
+    events published in between are not delivered.
+    """
+    # NOTIFY payload must be shorter than 8000 bytes in the default configuration
+    max_payload_size = 7999
+    is_shared = True
+    reconnect_delay = 1
+
+    def __init__(self, dsn: str):
+        self._dsn = dsn
+        self._connection = None
+        self._channels = set()
+        self._reconnect_task = None
+        # asyncpg connections don't allow concurrent operations
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        self._published = asyncio.Queue()
+        self._connection = await self._connect()
+
+    async def disconnect(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        self._channels.clear()
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            await connection.close()
+
+    async def _connect(self):
+        import asyncpg
+
+        connection = await asyncpg.connect(self._dsn)
+        connection.add_termination_listener(self._on_termination)
+        for channel in self._channels:
+            await connection.add_listener(channel, self._listener)
+        return connection
+
+    def _on_termination(self, connection):
+        # also called for connections closed by disconnect, these are no longer current
+        if connection is self._connection and self._reconnect_task is None:
+            logger.warning('Broadcast connection is lost, reconnecting.')
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        try:
+            while True:
+                try:
+                    async with self._lock:
+                        self._connection = await self._connect()
+                    return
+                except Exception:
+                    logger.exception('Failed to reconnect the broadcast.')
+                await asyncio.sleep(self.reconnect_delay)
+        finally:
+            self._reconnect_task = None
+
+    def _is_connected(self):
+        return self._connection is not None and not self._connection.is_closed()
+
+    def _listener(self, connection, pid, channel, payload):
+        self._published.put_nowait(Event(channel=channel, message=payload))
+
+    async def subscribe(self, channel):
+        async with self._lock:
+            self._channels.add(channel)
+            # otherwise listened to once reconnected
+            if self._is_connected():
+                await self._connection.add_listener(channel, self._listener)
+
+    async def unsubscribe(self, channel):
+        async with self._lock:
+            self._channels.discard(channel)
+            if self._is_connected():
+                await self._connection.remove_listener(channel, self._listener)
+
+    async def publish(self, channel, message):
+        if len(message.encode()) > self.max_payload_size:
+            logger.error(f'Broadcast message to {channel} is too large for NOTIFY, dropping it.')
+            return
+        async with self._lock:
+            if not self._is_connected():
+                raise ConnectionError('Broadcast connection is lost')
+            await self._connection.execute('SELECT pg_notify($1, $2);', channel, message)
+
+    async def next_published(self):
+        return await self._published.get()
+
+
+class Subscriber:
+    def __init__(self, queue: asyncio.Queue):
+        self._queue = queue
+
+    async def get(self) -> Event:
+        return await self._queue.get()
+
+    async def __aiter__(self) -> AsyncIterator[Event]:
+        while True:
+            yield await self.get()
+
+
+class Broadcast:
+    """fans out backend events to local subscribers.
+    a backend subscription is held per channel, no matter how many local subscribers it has.
+    """
+
+    def __init__(self, backend: BroadcastBackend):
+        self._backend = backend
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._listener_task = None
+
+    @property
+    def is_connected(self):
+        return self._listener_task is not None
+
+    @property
+    def is_shared(self):
+        return self._backend.is_shared
+
+    @property
+    def reaches_all_processes(self):
+        # the in-process backend does too, as long as the app runs in a single process
+        return self._backend.is_shared or settings.app_processes == 1
+
+    async def connect(self):
+        await self._backend.connect()
+        self._listener_task = asyncio.create_task(self._listen())
+
+    async def disconnect(self):
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            self._listener_task = None
+        self._subscribers.clear()
+        await self._backend.disconnect()
+
+    async def _listen(self):
+        while True:
+            event = await self._backend.next_published()
+            for queue in list(self._subscribers.get(event.channel, ())):
+                queue.put_nowait(event)
+
+    def can_publish(self, message: str) -> bool:
+        max_size = self._backend.max_payload_size
+        return max_size is None or len(message.encode()) <= max_size
+
+    async def publish(self, channel: str, message: str):
+        if not self.is_connected:
+            raise RuntimeError('Broadcast is not connected')
+        await self._backend.publish(channel, message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        if not self.is_connected:
+            raise RuntimeError('Broadcast is not connected')
+        queue = asyncio.Queue()
+        if not self._subscribers[channel]:
+            await self._backend.subscribe(channel)
+        self._subscribers[channel].add(queue)
+        try:
+            yield Subscriber(queue)
+        finally:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[channel]
+                    if self.is_connected:
+                        await self._backend.unsubscribe(channel)
+
+
+def get_broadcast_backend() -> BroadcastBackend:
+    if settings.broadcast_backend == 'memory':
+        return MemoryBroadcastBackend()
+    if settings.broadcast_backend == 'postgres':
+        from db import get_db_connection_dsn
+
+        return PostgresBroadcastBackend(get_db_connection_dsn())
+    raise ValueError(f'Unknown broadcast backend: {settings.broadcast_backend}')
+
+
+@lru_cache
+def get_broadcast() -> Broadcast:
+    return Broadcast(get_broadcast_backend())
@@ -20,6 +20,9 @@ class TimestampsMixin:
     - Related issue: https://github.com/fastapi/sqlmodel/issues/539
     """
 
+    # server generated timestamps are returned by the INSERT/UPDATE itself, no refresh needed
+    __mapper_args__ = {'eager_defaults': True}
+
     created_at: datetime = Field(
         default_factory=get_utc_now,
         sa_type=sa.DateTime(timezone=True),
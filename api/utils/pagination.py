@@ -1,32 +1,114 @@
-from sqlmodel import Session, func, select
+import base64
+import datetime
+import enum
+import json
 
+from sqlalchemy import ClauseElement, Executable, tuple_
+from sqlalchemy.ext.compiler import compiles
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-def pagination_dep(page: int | None = 1, page_size: int | None = 25):
+from utils.exceptions import ValidationError
+
+
+class TotalEnum(str, enum.Enum):
+    EXACT = 'exact'
+    # planner row estimate, close enough for a scrollbar
+    ESTIMATE = 'estimate'
+    NONE = 'none'
+
+
+def pagination_dep(
+    page: int | None = 1,
+    page_size: int | None = 25,
+    before: str | None = None,
+    after: str | None = None,
+    total: TotalEnum = TotalEnum.EXACT,
+):
+    """page number pagination by default.
+    passing `before` or `after` cursor switches to keyset pagination, empty `before` starts from the first item.
+    `total` picks how page number pagination counts the items, counting is skipped with `none`.
+    """
+    if before is not None and after is not None:
+        raise ValidationError({'__all__': ['Only one of before and after can be set']})
     return {
         'page': page,
         'page_size': page_size,
+        'before': before,
+        'after': after,
+        'total': total,
     }
 
 
-def paginate_response(
+class explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) of a statement, keeps its bound parameters.
+    """
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(explain, 'postgresql')
+def compile_explain(element, compiler, **kwargs):
+    return f'EXPLAIN (FORMAT JSON) {compiler.process(element.statement, **kwargs)}'
+
+
+async def estimate_count(query, db_session: AsyncSession) -> int:
+    """number of rows the planner expects the query to return, no rows are read.
+    """
+    plan = (await db_session.exec(explain(query))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+async def count_total(query, pagination: dict, db_session: AsyncSession) -> int | None:
+    total_mode = pagination.get('total', TotalEnum.EXACT)
+    if total_mode is TotalEnum.NONE:
+        return None
+    if total_mode is TotalEnum.ESTIMATE:
+        return await estimate_count(query, db_session)
+    return (await db_session.exec(
+        select(func.count()).select_from(query.subquery())
+    )).one()
+
+
+def is_cursor_pagination(pagination: dict):
+    return pagination.get('before') is not None or pagination.get('after') is not None
+
+
+async def paginate_response(
     query,
     pagination: dict,
-    db_session: Session,
+    db_session: AsyncSession,
+    total: int | None = None,
 ):
+    """`total` can be passed when it's known without counting, e.g. denormalized.
+    """
     next_page = None
     page = max(pagination.get('page', 1), 1)
     page_size = pagination.get('page_size', 25)
-    total = db_session.exec(
-        select(func.count()).select_from(query.subquery())
-    ).one()
+    if total is None:
+        total = await count_total(query, pagination, db_session)
     offset = (page - 1) * page_size
     results = []
-    if total:
-        results = db_session.exec(
+    if total is None or pagination.get('total') is TotalEnum.ESTIMATE:
+        # without an exact total, an extra row tells whether there is a next page
+        results = list((await db_session.exec(
+            query
+            .offset(offset)
+            .limit(page_size + 1)
+        )).all())
+        if len(results) > page_size:
+            results = results[:page_size]
+            next_page = page + 1
+    elif total:
+        results = (await db_session.exec(
             query
             .offset(offset)
             .limit(page_size)
-        ).all()
+        )).all()
         has_next = (offset + page_size) < total
         if has_next:
             next_page = page + 1
@@ -37,3 +119,71 @@ def paginate_response(
         'next': next_page,
         'results': results
     }
+
+
+def encode_cursor(values: tuple) -> str:
+    serialized = [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    return base64.urlsafe_b64encode(json.dumps(serialized).encode()).decode()
+
+
+def decode_cursor(cursor: str, columns: tuple) -> tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(columns):
+            raise ValueError('Cursor does not match the ordering')
+        return tuple(
+            datetime.datetime.fromisoformat(value) if column.type.python_type is datetime.datetime else value
+            for column, value in zip(columns, values)
+        )
+    except (ValueError, TypeError):
+        raise ValidationError({'__all__': ['Invalid cursor']})
+
+
+def get_item_cursor(item, columns: tuple) -> str:
+    return encode_cursor(tuple(getattr(item, column.key) for column in columns))
+
+
+async def paginate_by_cursor(
+    query,
+    columns: tuple,
+    pagination: dict,
+    db_session: AsyncSession,
+):
+    """keyset pagination over `columns` in descending order, the columns must be unique together.
+    unlike page numbers, the cost of a page doesn't depend on how deep it is.
+    `next` continues in the same direction, `previous` passed as `after` fetches items newer than the page.
+    """
+    page_size = pagination.get('page_size', 25)
+    before = pagination.get('before')
+    after = pagination.get('after')
+    key = tuple_(*columns)
+    if after:
+        query = query.where(key > decode_cursor(after, columns)).order_by(*columns)
+    else:
+        if before:
+            query = query.where(key < decode_cursor(before, columns))
+        query = query.order_by(*(column.desc() for column in columns))
+    results = list((await db_session.exec(query.limit(page_size + 1))).all())
+    has_next = len(results) > page_size
+    results = results[:page_size]
+    next_cursor = None
+    if has_next:
+        next_cursor = get_item_cursor(results[-1], columns)
+    if after:
+        # always newest first
+        results.reverse()
+    # nothing newer yet, the same cursor should be polled again
+    previous_cursor = after
+    if results:
+        previous_cursor = get_item_cursor(results[0], columns)
+    return {
+        'total': None,
+        'page': None,
+        'page_size': page_size,
+        'next': next_cursor,
+        'previous': previous_cursor,
+        'results': results,
+    }
@@ -19,7 +19,7 @@ class Request(FastApiRequest):
         token = self.scope.get('token')
         if not token:
             return None
-        decoded_token = decode_token(token)
+        decoded_token = self.scope.get('token_claims') or decode_token(token)
         return AccessToken(
             token=token,
             expires_at=decoded_token['expires_at']
@@ -1,10 +1,31 @@
+from functools import lru_cache
+
+import orjson
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse as FastApiJsonResponse
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+
+
+class JsonResponse(ORJSONResponse):
+    """renders with orjson, pydantic models are dumped by pydantic itself.
+    values orjson doesn't support natively go through jsonable_encoder.
+    """
+
+    def render(self, content) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode()
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+
+
+@lru_cache
+def get_type_adapter(model_type) -> TypeAdapter:
+    return TypeAdapter(model_type)
 
 
-class JsonResponse(FastApiJsonResponse):
-    def __init__(self, content, *args, **kwargs):
-        cleaned_content = content
-        if not isinstance(content, (list, tuple, dict)):
-            cleaned_content = jsonable_encoder(content)
-        super().__init__(content=cleaned_content, *args, **kwargs)
\ No newline at end of file
+def model_response(model_type, content, status_code: int = 200) -> Response:
+    """validates content, ORM objects included, and dumps it to JSON in a single pass through pydantic.
+    skips response model serialization of FastAPI, model_type should match the route response_model.
+    """
+    adapter = get_type_adapter(model_type)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+    return Response(content=body, status_code=status_code, media_type='application/json')
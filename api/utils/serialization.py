@@ -9,7 +9,7 @@ def serialize_errors(exception: RequestValidationError):
         location = pydantic_error['loc']
         message = pydantic_error['msg']
         cleaned_location = location[1:] if location[0] in ('body', 'query', 'path') else location
-        field_string = '.'.join(cleaned_location)
+        field_string = '.'.join(str(part) for part in cleaned_location)
         cleaned_message = message
         # dropping pydantic bullshit, leaving just real message
         if message.startswith('Value error, '):
@@ -0,0 +1,59 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from db import get_db_connection_dsn
+from utils.broadcast import Broadcast, MemoryBroadcastBackend, PostgresBroadcastBackend
+
+
+class BroadcastTestCase(IsolatedAsyncioTestCase):
+    async def assert_received(self, subscriber, channel, message):
+        event = await asyncio.wait_for(subscriber.get(), timeout=5)
+        self.assertEqual(event.channel, channel)
+        self.assertEqual(event.message, message)
+
+    async def test_memory(self):
+        broadcast = Broadcast(MemoryBroadcastBackend())
+        await broadcast.connect()
+        self.addAsyncCleanup(broadcast.disconnect)
+        async with (
+            broadcast.subscribe('room_1') as subscriber,
+            broadcast.subscribe('room_1') as another_subscriber,
+            broadcast.subscribe('room_2') as other_room_subscriber,
+        ):
+            with self.subTest('should deliver to every channel subscriber'):
+                await broadcast.publish('room_1', 'ping')
+                await self.assert_received(subscriber, 'room_1', 'ping')
+                await self.assert_received(another_subscriber, 'room_1', 'ping')
+            with self.subTest('should not deliver to other channels'):
+                await broadcast.publish('room_2', 'pong')
+                await self.assert_received(other_room_subscriber, 'room_2', 'pong')
+                self.assertTrue(subscriber._queue.empty())
+
+    async def test_postgres(self):
+        # two broadcasts with own connections act as two separate workers
+        listening_broadcast = Broadcast(PostgresBroadcastBackend(get_db_connection_dsn()))
+        publishing_broadcast = Broadcast(PostgresBroadcastBackend(get_db_connection_dsn()))
+        for broadcast in (listening_broadcast, publishing_broadcast):
+            await broadcast.connect()
+            self.addAsyncCleanup(broadcast.disconnect)
+        async with listening_broadcast.subscribe('room_1') as subscriber:
+            with self.subTest('should deliver across connections'):
+                await publishing_broadcast.publish('room_1', 'ping')
+                await self.assert_received(subscriber, 'room_1', 'ping')
+            with self.subTest('should drop messages NOTIFY can not carry'):
+                self.assertFalse(publishing_broadcast.can_publish('x' * 8000))
+                await publishing_broadcast.publish('room_1', 'x' * 8000)
+                await publishing_broadcast.publish('room_1', 'pong')
+                await self.assert_received(subscriber, 'room_1', 'pong')
+            with self.subTest('should listen again after the connection is lost'):
+                backend = listening_broadcast._backend
+                lost_connection = backend._connection
+                await publishing_broadcast._backend._connection.execute(
+                    'SELECT pg_terminate_backend($1);', lost_connection.get_server_pid(),
+                )
+                for _ in range(100):
+                    if backend._connection is not lost_connection and backend._is_connected():
+                        break
+                    await asyncio.sleep(0.05)
+                await publishing_broadcast.publish('room_1', 'ping')
+                await self.assert_received(subscriber, 'room_1', 'ping')
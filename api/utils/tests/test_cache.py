@@ -0,0 +1,36 @@
+from unittest import TestCase
+
+from freezegun import freeze_time
+
+from utils.cache import TTLCache
+
+
+class TTLCacheTestCase(TestCase):
+    def test_cache(self):
+        cache = TTLCache(max_size=2, ttl=60)
+        with self.subTest('should return stored values'):
+            cache.set('a', 1)
+            self.assertEqual(cache.get('a'), 1)
+            self.assertIsNone(cache.get('b'))
+        with self.subTest('should evict least recently used entries over max size'):
+            cache.set('b', 2)
+            cache.get('a')
+            cache.set('c', 3)
+            self.assertEqual(len(cache), 2)
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('a'), 1)
+        with self.subTest('should delete entries'):
+            cache.delete('a')
+            self.assertIsNone(cache.get('a'))
+
+    def test_expiry(self):
+        with freeze_time('2025-10-10T12:00:00Z') as frozen_time:
+            cache = TTLCache(max_size=10, ttl=60)
+            cache.set('a', 1)
+            frozen_time.tick(59)
+            with self.subTest('should return value before expiry'):
+                self.assertEqual(cache.get('a'), 1)
+            frozen_time.tick(2)
+            with self.subTest('should drop value after expiry'):
+                self.assertIsNone(cache.get('a'))
+                self.assertEqual(len(cache), 0)
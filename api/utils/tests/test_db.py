@@ -0,0 +1,54 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from sqlalchemy import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from conf import settings
+from db import ReplicaRouter, get_async_db_connection_dsn, get_async_engine
+
+
+class ReplicaRouterTestCase(IsolatedAsyncioTestCase):
+    def create_engine(self, db_host):
+        engine = create_async_engine(get_async_db_connection_dsn(db_host), poolclass=NullPool)
+        self.addAsyncCleanup(engine.dispose)
+        return engine
+
+    async def test_get_read_engine(self):
+        # the test database is not a replica, which counts as caught up
+        replica = self.create_engine(f'{settings.db_host}:{settings.db_port}')
+        with self.subTest('should use primary before replicas are checked'):
+            router = ReplicaRouter([replica], max_lag=5, check_interval=60)
+            self.assertIs(router.get_read_engine(), get_async_engine())
+        with self.subTest('should route reads to replica'):
+            await router.check_replicas()
+            self.assertIs(router.get_read_engine(), replica)
+        with self.subTest('should fall back to primary if replica lags behind'):
+            router = ReplicaRouter([replica], max_lag=-1, check_interval=60)
+            with self.assertLogs('db', level='WARNING'):
+                await router.check_replicas()
+            self.assertIs(router.get_read_engine(), get_async_engine())
+        with self.subTest('should skip unreachable replicas'):
+            unreachable = self.create_engine(f'{settings.db_host}:1')
+            router = ReplicaRouter([unreachable, replica], max_lag=5, check_interval=60)
+            with self.assertLogs('db', level='ERROR'):
+                await router.check_replicas()
+            self.assertIs(router.get_read_engine(), replica)
+            self.assertIs(router.get_read_engine(), replica)
+        with self.subTest('should use primary without replicas'):
+            router = ReplicaRouter([], max_lag=5, check_interval=60)
+            self.assertIs(router.get_read_engine(), get_async_engine())
+
+    async def test_background_checks(self):
+        replica = self.create_engine(f'{settings.db_host}:{settings.db_port}')
+        router = ReplicaRouter([replica], max_lag=5, check_interval=60)
+        with self.subTest('should check replicas once started'):
+            await router.start()
+            self.addAsyncCleanup(router.stop)
+            await asyncio.sleep(0.5)
+            self.assertIs(router.get_read_engine(), replica)
+        with self.subTest('should not check replicas on read'):
+            with patch.object(router, 'get_lag') as get_lag:
+                router.get_read_engine()
+            get_lag.assert_not_called()
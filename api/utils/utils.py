@@ -4,3 +4,14 @@ from datetime import datetime, timezone
 def get_utc_now():
     now = datetime.now(timezone.utc)
     return now
+
+
+def escape_like(value: str, escape_char: str = '\\'):
+    """escapes LIKE wildcards, so the value is matched literally.
+    """
+    return (
+        value
+        .replace(escape_char, escape_char * 2)
+        .replace('%', f'{escape_char}%')
+        .replace('_', f'{escape_char}_')
+    )